@@ -0,0 +1,7 @@
+"""
+Benchmarks of odoo-module-diff against synthetic Odoo-like repositories.
+
+Run them with::
+
+    python -m benchmarks.run --sizes 200,1000,5000 --output results.json
+"""
@@ -0,0 +1,168 @@
+"""
+Time the main stages of odoo-module-diff on synthetic repositories
+of several sizes and save the results as JSON, optionally comparing
+them with the results of a previous version.
+"""
+
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict
+
+import git
+import typer
+
+from benchmarks.synthetic_repo import generate_repo
+from odoo_module_diff import __version__
+from odoo_module_diff.history import addon_models_path, bucket_commits_by_addon
+from odoo_module_diff.main import (
+    RELEASE_COMMITS_FILE,
+    find_end_commit_by_serie,
+    scan,
+    scan_addon_commits,
+    scan_commit,
+)
+
+TARGET_SERIE = 16
+REGRESSION_RATIO = 1.2
+
+
+def timed(function: Callable, repeat: int) -> float:
+    """
+    Best wall time of function over repeat runs, its output silenced.
+    """
+    best = None
+    for _i in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_size(n_commits: int, n_addons: int, repeat: int, work_dir: str) -> Dict:
+    repo_path = f"{work_dir}/odoo-{n_commits}"
+    timings = {}
+    start = time.perf_counter()
+    generate_repo(repo_path, n_commits, n_addons)
+    timings["generate_repo"] = time.perf_counter() - start
+
+    repo = git.Repo(repo_path)
+    head = repo.commit(f"{TARGET_SERIE}.0")
+    releases_file = os.path.join(repo.git_dir, RELEASE_COMMITS_FILE)
+
+    def find_uncached():
+        if os.path.exists(releases_file):
+            os.remove(releases_file)
+        find_end_commit_by_serie(repo, TARGET_SERIE, head)
+
+    timings["find_end_commit_by_serie"] = timed(find_uncached, repeat)
+    timings["find_end_commit_by_serie_cached"] = timed(
+        lambda: find_end_commit_by_serie(repo, TARGET_SERIE, head), repeat
+    )
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        end_commit, _found = find_end_commit_by_serie(repo, TARGET_SERIE, head)
+    start_commit = repo.merge_base(head, repo.commit(f"{TARGET_SERIE - 1}.0"))[0]
+    addon_commits = bucket_commits_by_addon(repo, start_commit, end_commit, ["base"])
+    commits = [repo.commit(sha) for sha in addon_commits.get("base", {})]
+    module_path = addon_models_path("base")
+
+    def scan_commits():
+        for commit in commits:
+            scan_commit(module_path, commit)
+
+    timings["scan_commit"] = timed(scan_commits, repeat) / max(len(commits), 1)
+    timings["scan_addon_commits"] = timed(
+        lambda: scan_addon_commits(
+            repo,
+            "base",
+            start_commit,
+            end_commit,
+            f"{work_dir}/output-{n_commits}/addon/base",
+            keep_noise=True,
+        ),
+        repeat,
+    )
+    timings["scan"] = timed(
+        lambda: scan(
+            repo_path,
+            TARGET_SERIE,
+            f"{work_dir}/output-{n_commits}/scan",
+            keep_noise=True,
+        ),
+        repeat,
+    )
+    return {
+        "commits": n_commits,
+        "addons": n_addons,
+        "base_commits": len(commits),
+        "timings": timings,
+    }
+
+
+def compare_results(results: Dict, previous: Dict):
+    previous_runs = {(run["commits"], run["addons"]): run for run in previous["runs"]}
+    print(f"\nComparison with version {previous.get('version')}:")
+    for run in results["runs"]:
+        previous_run = previous_runs.get((run["commits"], run["addons"]))
+        if previous_run is None:
+            continue
+        for stage, elapsed in run["timings"].items():
+            previous_elapsed = previous_run["timings"].get(stage)
+            if not previous_elapsed:
+                continue
+            ratio = elapsed / previous_elapsed
+            flag = "  REGRESSION" if ratio > REGRESSION_RATIO else ""
+            print(
+                f"  {run['commits']:>6} commits {stage:<34} "
+                f"{previous_elapsed:9.4f}s -> {elapsed:9.4f}s  x{ratio:.2f}{flag}"
+            )
+
+
+app = typer.Typer()
+
+
+@app.command()
+def main(
+    sizes: str = "200,1000,5000",
+    addons: int = 20,
+    repeat: int = 3,
+    output: str = "benchmark_results.json",
+    compare: str = "",
+):
+    results = {
+        "version": __version__,
+        "python": platform.python_version(),
+        "git": subprocess.run(
+            ["git", "--version"], capture_output=True, text=True
+        ).stdout.strip(),
+        "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "runs": [],
+    }
+    with tempfile.TemporaryDirectory(prefix="odoo-module-diff-bench-") as work_dir:
+        for size in sizes.split(","):
+            run = bench_size(int(size), addons, repeat, work_dir)
+            results["runs"].append(run)
+            print(f"\n{run['commits']} commits, {run['addons']} addons:")
+            for stage, elapsed in run["timings"].items():
+                print(f"  {stage:<34} {elapsed:9.4f}s")
+
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved in {output}")
+
+    if compare:
+        with open(compare) as f:
+            compare_results(results, json.load(f))
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,238 @@
+"""
+Generate throwaway git repositories shaped like Odoo: addons with models,
+base models in odoo/addons/base/models/, "[REL] N.0" commits, N.0 branches
+and commits adding, removing and changing fields.
+The history is written with a single git fast-import process.
+"""
+
+import random
+import subprocess
+from typing import Dict, List
+
+FIELD_TYPES = [
+    "Char",
+    "Text",
+    "Html",
+    "Integer",
+    "Float",
+    "Boolean",
+    "Many2one",
+    "One2many",
+    "Many2many",
+]
+FIELD_TYPE_SWAPS = {"Char": "Text", "Text": "Html", "Integer": "Float"}
+FIELD_ATTRS = [
+    "",
+    ", store=True",
+    ", compute='_compute_value'",
+    ", company_dependent=True",
+    ", readonly=True",
+    ", help='Some help'",
+]
+MODEL_KINDS = ["Model", "Model", "TransientModel", "AbstractModel"]
+TAGS = ["[FIX]", "[IMP]", "[REF]", "[ADD]"]
+
+
+class SyntheticOdoo:
+    """
+    In memory state of the synthetic Odoo code base and the fast-import
+    stream building its history.
+    """
+
+    def __init__(self, n_addons: int, seed: int = 0, files_per_addon: int = 2):
+        self.rnd = random.Random(seed)
+        self.addons = ["base"] + [f"addon_{i}" for i in range(n_addons)]
+        # excluded from the scans by the default prefix filter:
+        self.addons += ["l10n_xx", "website_yy"]
+        self.files = {}  # path -> {model: {"kind", "inherit", "fields"}}
+        self.last_path = ""
+        self.stream: List[bytes] = []
+        self.mark = 0
+        self.time = 1600000000
+        self.pr = 1000
+        for addon in self.addons:
+            for i in range(files_per_addon):
+                models = {}
+                for j in range(2):
+                    models[f"{addon}.model{i}{j}"] = {
+                        "kind": self.rnd.choice(MODEL_KINDS),
+                        "inherit": self.rnd.choice([None, "mail.thread"]),
+                        "fields": {f"field_{k}": self.new_field() for k in range(6)},
+                    }
+                self.files[self.models_path(addon, f"models{i}.py")] = models
+
+    def new_field(self):
+        return (
+            self.rnd.choice(FIELD_TYPES),
+            self.rnd.choice(FIELD_ATTRS),
+            self.rnd.random() < 0.3,  # declared on several lines
+        )
+
+    @staticmethod
+    def models_path(addon: str, filename: str):
+        if addon == "base":
+            return f"odoo/addons/base/models/{filename}"
+        return f"addons/{addon}/models/{filename}"
+
+    @staticmethod
+    def render(models: Dict) -> str:
+        lines = ["from odoo import fields, models", ""]
+        for name, model in models.items():
+            class_name = "".join(part.title() for part in name.split("."))
+            lines.append(f"class {class_name}(models.{model['kind']}):")
+            lines.append(f"    _name = '{name}'")
+            if model["inherit"]:
+                lines.append("    _inherit = [")
+                lines.append(f"        '{model['inherit']}',")
+                lines.append("    ]")
+            for field, (field_type, attrs, multiline) in model["fields"].items():
+                if multiline:
+                    lines.append(f"    {field} = fields.{field_type}(")
+                    lines.append(f"        string='{field}'{attrs},")
+                    lines.append("    )")
+                else:
+                    lines.append(
+                        f"    {field} = fields.{field_type}(string='{field}'{attrs})"
+                    )
+            lines.append("")
+        return "\n".join(lines) + "\n"
+
+    def manifest(self, addon: str) -> str:
+        index = self.addons.index(addon)
+        depends = ["base"]
+        if addon.startswith("addon_") and index > 1:
+            depends.append(self.addons[self.rnd.randint(1, index - 1)])
+        return repr({"name": addon, "version": "1.0", "depends": depends}) + "\n"
+
+    def data(self, content: str):
+        payload = content.encode()
+        self.stream.append(b"data %d\n" % len(payload) + payload + b"\n")
+
+    def commit(
+        self,
+        branch: str,
+        message: str,
+        files: Dict[str, str],
+        parent: str = "",
+        merge: str = "",
+    ) -> str:
+        self.mark += 1
+        self.time += 3600
+        self.stream.append(f"commit refs/heads/{branch}\nmark :{self.mark}\n".encode())
+        self.stream.append(
+            f"author Dev Eloper <dev@example.com> {self.time} +0000\n".encode()
+        )
+        self.stream.append(
+            f"committer Dev Eloper <dev@example.com> {self.time} +0000\n".encode()
+        )
+        self.data(message)
+        if parent:
+            self.stream.append(f"from {parent}\n".encode())
+        if merge:
+            self.stream.append(f"merge {merge}\n".encode())
+        for path, content in files.items():
+            self.stream.append(f"M 100644 inline {path}\n".encode())
+            self.data(content)
+        self.stream.append(b"\n")
+        return f":{self.mark}"
+
+    def mutate(self, branch: str, parent: str = "") -> str:
+        """
+        Commit a random change to the fields of a model.
+        """
+        rnd = self.rnd
+        path = rnd.choice(sorted(self.files))
+        models = self.files[path]
+        model = models[rnd.choice(sorted(models))]
+        fields = model["fields"]
+        kind = rnd.random()
+        is_big_feature = kind > 0.95
+        if is_big_feature:
+            for i in range(30):
+                fields[f"feature_{self.mark}_{i}"] = self.new_field()
+        else:
+            for _i in range(rnd.randint(1, 14)):
+                operation = rnd.random()
+                if operation < 0.3 and fields:
+                    del fields[rnd.choice(sorted(fields))]
+                elif operation < 0.6:
+                    fields[f"field_{rnd.randint(0, 40)}"] = self.new_field()
+                elif operation < 0.85 and fields:
+                    field = rnd.choice(sorted(fields))
+                    field_type, _attrs, multiline = fields[field]
+                    field_type = rnd.choice(
+                        [field_type, FIELD_TYPE_SWAPS.get(field_type, field_type)]
+                    )
+                    fields[field] = (field_type, rnd.choice(FIELD_ATTRS), multiline)
+                else:
+                    model["inherit"] = rnd.choice([None, "mail.thread", "portal.mixin"])
+
+        self.last_path = path
+        self.pr += 1
+        addon = path.split("/")[1] if path.startswith("addons/") else "base"
+        summary = f"{rnd.choice(TAGS)} {addon}: change {self.pr}"
+        if kind < 0.04:
+            summary = f"[FW] Forward-Port of {summary}"
+        body_lines = 60 if is_big_feature else rnd.choice([0, 3, 10, 25, 50])
+        body = "\n".join(f"explanation line {i}" for i in range(body_lines))
+        if 0.94 < kind < 0.95:
+            body += "\nadapt model class names to correspond to model names"
+        message = f"{summary}\n\n{body}\n\ncloses odoo/odoo#{self.pr}\n"
+        return self.commit(branch, message, {path: self.render(models)}, parent=parent)
+
+
+def generate_repo(
+    path: str,
+    n_commits: int = 1000,
+    n_addons: int = 20,
+    series: List[int] = (15, 16, 17),
+    seed: int = 0,
+):
+    """
+    Create a git repository at path with about n_commits commits spread
+    over the series. Every serie but the last one gets a "[REL] N.0"
+    commit, a N.0 branch with a few stable fixes and a merge of a side
+    branch on master. The last serie only lives in master.
+    """
+    repo = SyntheticOdoo(n_addons, seed)
+    files = {path_: repo.render(models) for path_, models in repo.files.items()}
+    for addon in repo.addons:
+        if addon != "base":
+            files[f"addons/{addon}/__manifest__.py"] = repo.manifest(addon)
+    head = repo.commit("master", "[INIT] odoo\n", files)
+
+    per_serie = max(n_commits // len(series), 1)
+    for serie in series:
+        for _i in range(per_serie):
+            head = repo.mutate("master")
+        if serie == series[-1]:
+            break
+        head = repo.commit("master", f"[REL] {serie}.0\n", {})
+        release = head
+        for i in range(3):
+            release = repo.commit(
+                f"{serie}.0", f"[FIX] stable {serie}.0 fix {i}\n", {}, parent=release
+            )
+        side_paths = set()
+        side = repo.mutate(f"side-{serie}", parent=head)
+        side_paths.add(repo.last_path)
+        side = repo.mutate(f"side-{serie}")
+        side_paths.add(repo.last_path)
+        head = repo.mutate("master", parent=head)
+        side_paths.add(repo.last_path)
+        head = repo.commit(
+            "master",
+            f"Merge side-{serie}\n",
+            {path_: repo.render(repo.files[path_]) for path_ in side_paths},
+            parent=head,
+            merge=side,
+        )
+
+    subprocess.run(["git", "init", "-q", "-b", "master", path], check=True)
+    subprocess.run(
+        ["git", "fast-import", "--quiet"],
+        input=b"".join(repo.stream),
+        cwd=path,
+        check=True,
+    )
+    subprocess.run(["git", "checkout", "-q", "master"], cwd=path, check=True)
@@ -0,0 +1,45 @@
+from collections import OrderedDict
+
+import git
+
+DEFAULT_BLOB_CACHE_SIZE = 256  # MB
+
+
+class BlobCache:
+    """
+    In memory LRU cache of blob contents keyed by blob sha. Missing blobs
+    are read through the single long lived git cat-file --batch process
+    of the repo, so a blob shared by several commits, parents or series
+    is read only once.
+    """
+
+    def __init__(self, repo: git.Repo, max_size: int = DEFAULT_BLOB_CACHE_SIZE):
+        self.repo = repo
+        self.max_size = max_size * 1024 * 1024
+        self.size = 0
+        self.blobs: OrderedDict[str, bytes] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def read(self, sha: str) -> bytes:
+        data = self.blobs.get(sha)
+        if data is not None:
+            self.hits += 1
+            self.blobs.move_to_end(sha)
+            return data
+        self.misses += 1
+        _sha, _type, _size, data = self.repo.git.get_object_data(sha)
+        self.blobs[sha] = data
+        self.size += len(data)
+        while self.size > self.max_size and len(self.blobs) > 1:
+            _sha, evicted = self.blobs.popitem(last=False)
+            self.size -= len(evicted)
+        return data
+
+    def report(self):
+        reads = self.hits + self.misses
+        if reads:
+            print(
+                f"Blob cache: {self.hits} hits, {self.misses} misses"
+                f" ({100 * self.hits / reads:.1f}% hit rate)"
+            )
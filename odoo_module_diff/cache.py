@@ -0,0 +1,111 @@
+import json
+import os
+import sqlite3
+import time
+from typing import Iterable, Optional, Set
+
+DEFAULT_CACHE_SIZE = 1024  # MB
+
+
+class ScoreCache:
+    """
+    On disk SQLite cache of the commit scores. Entries are keyed by
+    commit sha, models path and version of the scanning heuristics
+    and the least recently used ones are evicted beyond max_size MB.
+    """
+
+    def __init__(
+        self, cache_dir: str, version: str, max_size: int = DEFAULT_CACHE_SIZE
+    ):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.version = version
+        self.max_size = max_size * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        # every write is committed at once (autocommit) so the parallel
+        # workers sharing the cache never hold its write lock for long
+        self.conn = sqlite3.connect(
+            f"{cache_dir}/scores.sqlite", timeout=60, isolation_level=None
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS scores (
+                sha TEXT NOT NULL,
+                path TEXT NOT NULL,
+                version TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                used REAL NOT NULL,
+                PRIMARY KEY (sha, path, version)
+            )"""
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS scores_used ON scores (used)")
+        self.conn.commit()
+
+    def get(self, sha: str, path: str) -> Optional[tuple]:
+        """
+        Return (diff_items, score_del, score_add, score_feat, matches,
+        total_changes) or None.
+        """
+        row = self.conn.execute(
+            "SELECT value FROM scores WHERE sha=? AND path=? AND version=?",
+            (sha, path, self.version),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.conn.execute(
+            "UPDATE scores SET used=? WHERE sha=? AND path=? AND version=?",
+            (time.time(), sha, path, self.version),
+        )
+        return tuple(json.loads(row[0]))
+
+    def cached_shas(self, shas: Iterable[str], path: str) -> Set[str]:
+        """
+        Tell which of the commits have cached scores for the path without
+        loading them, the others are counted as misses.
+        """
+        shas = set(shas)
+        cached = shas & {
+            row[0]
+            for row in self.conn.execute(
+                "SELECT sha FROM scores WHERE path=? AND version=?",
+                (path, self.version),
+            )
+        }
+        self.misses += len(shas) - len(cached)
+        return cached
+
+    def put(self, sha: str, path: str, value: tuple):
+        data = json.dumps(value)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?, ?)",
+            (sha, path, self.version, data, len(data), time.time()),
+        )
+
+    def prune(self):
+        """
+        Evict the least recently used entries until the cache fits max_size.
+        """
+        total = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM scores"
+        ).fetchone()[0]
+        if total <= self.max_size:
+            return
+        rows = self.conn.execute("SELECT rowid, size FROM scores ORDER BY used")
+        evicted = []
+        for rowid, size in rows:
+            if total <= self.max_size:
+                break
+            evicted.append((rowid,))
+            total -= size
+        self.conn.execute("BEGIN")
+        self.conn.executemany("DELETE FROM scores WHERE rowid=?", evicted)
+        self.conn.commit()
+        print(f"Evicted {len(evicted)} entries from the score cache.")
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
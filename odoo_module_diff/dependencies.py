@@ -0,0 +1,105 @@
+import ast
+from typing import Dict, Iterable, List, Optional, Set
+
+import git
+
+from odoo_module_diff.blobs import BlobCache
+
+ADDONS_PATHS = ("odoo/addons", "addons")
+MANIFEST_NAMES = ("__manifest__.py", "__openerp__.py")
+ENTERPRISE_LICENSE = "OEEL-1"
+
+
+def read_manifests(
+    commit: git.Commit,
+    blobs: Optional[BlobCache] = None,
+    addons_paths: Iterable[str] = ADDONS_PATHS,
+) -> Dict[str, Dict]:
+    """
+    Read the manifests of all the addons of the commit tree once
+    (the addons path is the one of the scanned repo, nothing is checked out).
+    Manifests unchanged since a previously read serie come from blobs.
+    An empty addons path stands for the top directory of the repo.
+    """
+    manifests = {}
+    for addons_path in addons_paths:
+        try:
+            addons_tree = commit.tree / addons_path if addons_path else commit.tree
+        except KeyError:
+            continue
+        for addon_tree in addons_tree.trees:
+            for name in MANIFEST_NAMES:
+                try:
+                    blob = addon_tree / name
+                except KeyError:
+                    continue
+                if blobs is not None:
+                    data = blobs.read(blob.hexsha)
+                else:
+                    data = blob.data_stream.read()
+                try:
+                    manifest = ast.literal_eval(data.decode("utf-8", errors="ignore"))
+                except (SyntaxError, ValueError):
+                    manifest = {}
+                manifests[addon_tree.name] = manifest
+                break
+    return manifests
+
+
+def addon_version(
+    name: str, manifest: Dict, serie: str, core_addons: Optional[Set[str]] = None
+) -> str:
+    """
+    The version of an addon as manifestoo tree shows it: <serie>+c for the
+    core addons (all of them if core_addons is None), <serie>+e for the
+    enterprise ones, else the version of its manifest.
+    """
+    if core_addons is None or name in core_addons:
+        return f"{serie}+c"
+    if manifest.get("license") == ENTERPRISE_LICENSE:
+        return f"{serie}+e"
+    return manifest.get("version") or "no version"
+
+
+def dependency_tree(
+    addon: str,
+    manifests: Dict[str, Dict],
+    serie: str,
+    core_addons: Optional[Set[str]] = None,
+) -> str:
+    """
+    Render the dependency tree of an addon like manifestoo tree does.
+    Only the core_addons are considered core addons (all the addons of the
+    scanned repo if None).
+    """
+    if addon == "base":
+        return ""
+    lines: List[str] = []
+    seen: Set[str] = set()
+
+    def render(indent: List[str], name: str):
+        # inspired by https://stackoverflow.com/a/59109706
+        line = f"{''.join(indent)}{name}"
+        if name in seen:
+            lines.append(f"{line} ⬆")
+            return
+        if name in manifests:
+            version = addon_version(name, manifests[name], serie, core_addons)
+            lines.append(f"{line} ({version})")
+        else:
+            lines.append(f"{line} (✘ not installed)")
+            return
+        seen.add(name)
+        children = sorted(
+            depend for depend in manifests[name].get("depends", []) if depend != "base"
+        )
+        pointers = ["├── "] * (len(children) - 1) + ["└── "]
+        for pointer, child in zip(pointers, children):
+            if indent:
+                spacer = "│   " if indent[-1] == "├── " else "    "
+                render(indent[:-1] + [spacer, pointer], child)
+            else:
+                render([pointer], child)
+
+    render([], addon)
+    return "\n".join(lines) + "\n"
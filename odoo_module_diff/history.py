@@ -0,0 +1,633 @@
+import re
+import subprocess
+import threading
+from collections import defaultdict
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+import git
+from git.diff import Diff
+
+ODOO_ADDONS_ROOT = "addons"  # the Odoo layout with base in odoo/addons
+BASE_MODELS_PATH = "odoo/addons/base/models/"
+ADDONS_MODELS_PATHSPEC = "addons/*/models/*"
+# the line scanners only score -/+ lines indented like class attributes
+# (4 to 7 spaces once tabs are single spaces). Lines with non ascii chars
+# in their indent (undecodable bytes are dropped) and lines python would
+# split on other separators than the newline are kept too.
+STRUCTURAL_LINE_REGEX = (
+    "^[ \t]{4,7}[^ \t]|^[ \t]*[^ -~\t]|[\r\v\f\x1c-\x1e]|\u0085|\u2028|\u2029"
+)
+# a class attribute (or model field) declaration line
+DECLARATION_REGEX = re.compile(r"^(?: {4}|\t)(\w+)[ \t]*=(?!=)")
+# the other class level lines ending a declaration
+CLASS_LEVEL_REGEX = re.compile(
+    r"^(?: {4}|\t)?(?:def |async def |@|class )|^[^ \t#)\]}]"
+)
+# git log --format=oneline header, with the parent the diff is against with -m
+ONELINE_HEADER_REGEX = re.compile(
+    r"^([0-9a-f]{40,64})(?: \(from ([0-9a-f]{40,64})\))?(?: |$)"
+)
+
+
+class FilePatch(NamedTuple):
+    """
+    The patch of a file between a commit and one of its parents,
+    with the same a_path, b_path and diff attributes as a GitPython Diff.
+    """
+
+    a_path: Optional[str]
+    b_path: Optional[str]
+    diff: bytes
+
+
+class BlobChange(NamedTuple):
+    """
+    The blob shas of a file changed between a commit and one of its parents
+    (a_path or b_path is None when the file was added or deleted).
+    """
+
+    a_path: Optional[str]
+    b_path: Optional[str]
+    a_blob: str
+    b_blob: str
+
+
+def addon_models_path(addon: str, root: str = ODOO_ADDONS_ROOT):
+    if addon == "base" and root == ODOO_ADDONS_ROOT:
+        return BASE_MODELS_PATH
+    return f"{root}/{addon}/models/" if root else f"{addon}/models/"
+
+
+def addon_from_path(path: str, root: str = ODOO_ADDONS_ROOT) -> Optional[str]:
+    """
+    Return the addon owning a models file path or None.
+    """
+    if root == ODOO_ADDONS_ROOT and path.startswith(BASE_MODELS_PATH):
+        return "base"
+    if root:
+        if not path.startswith(f"{root}/"):
+            return None
+        path = path[len(root) + 1 :]
+    parts = path.split("/")
+    if len(parts) > 2 and parts[1] == "models":
+        return parts[0]
+    return None
+
+
+def models_pathspecs(addons: List[str], root: str = ODOO_ADDONS_ROOT) -> List[str]:
+    """
+    The pathspecs of the models of the addons living in the root dir
+    (the top directory of the repo if root is empty).
+    """
+    if len(addons) == 1:
+        return [addon_models_path(addons[0], root)]
+    if root == ODOO_ADDONS_ROOT:
+        return [ADDONS_MODELS_PATHSPEC, BASE_MODELS_PATH]
+    return [f"{root}/*/models/*" if root else "*/models/*"]
+
+
+def bucket_commits_by_addon(
+    repo: git.Repo,
+    start_commit: git.Commit,
+    end_commit: git.Commit,
+    addons: List[str],
+    root: str = ODOO_ADDONS_ROOT,
+) -> Dict[str, Dict[str, int]]:
+    """
+    Walk the start..end range only once and bucket the commit shas
+    by the addons whose models they touch (in git log order).
+    The history is simplified at the merges for each addon like a
+    path limited git log of the addon models would do, and a merge commit
+    is kept for an addon only if it differs from all its parents there.
+    Each sha is mapped to the number of lines it changed in the addon
+    models against its first parent, like commit.stats would count them.
+    """
+    changes = _walk_changes(
+        repo, [f"{start_commit.hexsha}..{end_commit.hexsha}"], addons, root
+    )
+    return _simplify_buckets(
+        repo, start_commit.hexsha, end_commit.hexsha, addons, changes
+    )
+
+
+def bucket_commits_by_range(
+    repo: git.Repo,
+    ranges: Dict[str, Tuple[str, str]],
+    addons: List[str],
+    root: str = ODOO_ADDONS_ROOT,
+) -> Dict[str, Dict[str, Dict[str, int]]]:
+    """
+    Walk the union of several start..end sha ranges (one per serie)
+    only once and bucket the commits like bucket_commits_by_addon,
+    then split the buckets by range: {key: {addon: {sha: changes}}}.
+    The walk stops at the common ancestor of the range starts and the
+    history of each range is simplified from cheap unfiltered rev-lists.
+    """
+    # sparse: a merge the same as the walk bottom (a parent the ranges
+    # starting later don't walk) is hidden by git but may show in them.
+    changes = _walk_changes(repo, union_revs(repo, ranges), addons, root, sparse=True)
+    return {
+        key: _simplify_buckets(repo, start, end, addons, changes)
+        for key, (start, end) in ranges.items()
+    }
+
+
+def union_revs(repo: git.Repo, ranges: Dict[str, Tuple[str, str]]) -> List[str]:
+    """
+    git log revisions covering the union of several start..end sha ranges.
+    """
+    starts = sorted({start for start, _end in ranges.values()})
+    base = starts[0]
+    if len(starts) > 1:
+        base = repo.git.merge_base("--octopus", *starts)
+    ends = sorted({end for _start, end in ranges.values()})
+    return [*ends, f"^{base}"]
+
+
+def structural_commits_by_addon(
+    repo: git.Repo, revs: List[str], addons: List[str], root: str = ODOO_ADDONS_ROOT
+) -> Dict[str, set]:
+    """
+    Ask git which commits of the revs have -/+ lines the line scanners
+    could score (git log -G, against every parent of the merges) in the
+    models of each addon. The other commits can't be kept by the scan.
+    """
+    pathspecs = models_pathspecs(addons, root)
+    wanted = set(addons)
+    commits = defaultdict(set)
+    output = repo.git(c="core.quotepath=off").log(
+        *revs,
+        "-m",
+        "--full-history",
+        "--no-renames",
+        f"-G{STRUCTURAL_LINE_REGEX}",
+        "--name-only",
+        "--format=%x00%H",
+        "--",
+        *pathspecs,
+    )
+    sha = None
+    for line in output.splitlines():
+        if line.startswith("\0"):
+            sha = line[1:]
+        elif line and sha is not None:
+            addon = addon_from_path(line, root)
+            if addon in wanted:
+                commits[addon].add(sha)
+    return commits
+
+
+def commits_changing_names(
+    repo: git.Repo,
+    revs: List[str],
+    path: str,
+    names: Iterable[str],
+    attrs: Iterable[str],
+) -> Dict[str, Set[Optional[str]]]:
+    """
+    Ask git which commits of the revs have -/+ lines declaring one of the
+    names (fields, _inherit or _inherits) or setting one of the attrs in
+    the path (git log -G, against every parent of the merges) and read from
+    their patches the names of the declarations they change.
+    A changed attr line whose declaration is out of the hunk context is
+    attributed to None.
+    """
+    attrs = tuple(attrs)
+    pattern = "|".join(
+        [
+            f"^[ \t]*({'|'.join(re.escape(name) for name in sorted(names))})[ \t]*=",
+            *(re.escape(attr) for attr in attrs),
+        ]
+    )
+    proc = repo.git(c="core.quotepath=off").log(
+        *revs,
+        "-m",
+        "--full-history",
+        "--no-renames",
+        "--no-ext-diff",
+        "--no-color",
+        f"-G{pattern}",
+        "-p",
+        "-U10",  # more context lines so the declarations are rarely unknown
+        "--format=%x00%H",
+        "--",
+        path,
+        as_process=True,
+    )
+    changed_names = defaultdict(set)
+    sha, in_hunk, current = None, False, None
+    for raw_line in proc.stdout:
+        line = raw_line.decode("utf-8", errors="ignore").rstrip("\n")
+        if line.startswith("\0"):
+            sha, in_hunk = line[1:], False
+        elif line.startswith("diff --git "):
+            in_hunk = False
+        elif line.startswith("@@"):
+            # the declaration of the first lines is unknown
+            in_hunk, current = True, None
+        elif in_hunk and line[:1] in (" ", "-", "+"):
+            body = line[1:]
+            declaration = DECLARATION_REGEX.match(body)
+            if declaration:
+                current = declaration.group(1)
+            elif CLASS_LEVEL_REGEX.match(body):
+                current = ""  # a method, decorator or class
+            if line[0] == " " or not body.strip():
+                continue
+            if current:
+                changed_names[sha].add(current)
+            elif current is None and any(attr in body for attr in attrs):
+                changed_names[sha].add(None)
+    status = proc.wait()
+    if status:
+        raise git.GitCommandError(proc.args, status)
+    return changed_names
+
+
+def _walk_changes(
+    repo: git.Repo,
+    revs: List[str],
+    addons: List[str],
+    root: str = ODOO_ADDONS_ROOT,
+    sparse: bool = False,
+) -> Dict[str, Dict[str, Dict[str, int]]]:
+    """
+    Walk the full history of the revs touching the addons models only once
+    and map the commit shas (in git log order) to the lines they changed
+    by addon against each of their parents: {sha: {parent: {addon: changes}}}.
+    A merge has no entry for the parents it is the same as in all models
+    and the single parent of the other commits is keyed as "".
+    With sparse, the merges the same as one of their walked parents are
+    listed too (git log --sparse).
+    """
+    pathspecs = models_pathspecs(addons, root)
+    wanted = set(addons)
+
+    changes = defaultdict(dict)
+    # the oneline headers of the merge diffs tell the parent they are against
+    proc = repo.git(c="core.quotepath=off").log(
+        *revs,
+        "-m",
+        "--full-history",
+        *(["--sparse"] if sparse else []),
+        "--numstat",
+        "--no-renames",
+        "--format=oneline",
+        "--no-abbrev-commit",
+        "--no-decorate",
+        "--no-color",
+        "--",
+        *pathspecs,
+        as_process=True,
+    )
+    block = None
+    for raw_line in proc.stdout:
+        line = raw_line.decode("utf-8", errors="ignore").rstrip("\n")
+        header = ONELINE_HEADER_REGEX.match(line)
+        if header:
+            block = changes[header.group(1)].setdefault(
+                header.group(2) or "", defaultdict(int)
+            )
+        elif line and block is not None:
+            insertions, deletions, path = line.split("\t", 2)
+            addon = addon_from_path(path, root)
+            if addon in wanted:
+                # binary files are counted as 0 lines, as in commit.stats
+                block[addon] += (insertions != "-" and int(insertions) or 0) + (
+                    deletions != "-" and int(deletions) or 0
+                )
+    status = proc.wait()
+    if status:
+        raise git.GitCommandError(proc.args, status)
+    return changes
+
+
+def _simplify_buckets(
+    repo: git.Repo,
+    start: str,
+    end: str,
+    addons: List[str],
+    changes: Dict[str, Dict[str, Dict[str, int]]],
+) -> Dict[str, Dict[str, int]]:
+    """
+    Bucket the changes of the commits of the start..end range by addon,
+    simplifying the history of each addon like git log does for a path:
+    a merge the same as one of its parents in the range (or the start)
+    for the addon models only leads to the first such parent, so the side
+    branches it discarded are not walked.
+    The addons reaching each commit are tracked as bitsets.
+    """
+    bits = {addon: 1 << i for i, addon in enumerate(addons)}
+
+    def mask(block: Optional[Dict[str, int]]) -> int:
+        result = 0
+        for addon in block or ():
+            result |= bits[addon]
+        return result
+
+    graph = [
+        line.split()
+        for line in repo.git.rev_list(
+            "--topo-order", "--parents", f"{start}..{end}"
+        ).splitlines()
+    ]
+    # like git, the start commit is a relevant parent too
+    relevant = {line[0] for line in graph} | {repo.git.rev_parse(start)}
+    reach = defaultdict(int)
+    reach[repo.git.rev_parse(end)] = (1 << len(addons)) - 1
+    kept = {}
+    for sha, *parents in graph:
+        addon_mask = reach.pop(sha, 0)
+        if not addon_mask:
+            continue
+        blocks = changes.get(sha, {})
+        if len(parents) > 1:
+            relevant_parents = [parent for parent in parents if parent in relevant]
+            rest = addon_mask
+            for parent in relevant_parents:
+                same = rest & ~mask(blocks.get(parent))
+                reach[parent] |= same
+                rest &= ~same
+            for parent in relevant_parents:
+                reach[parent] |= rest
+            # the merge is kept where it differs from all its relevant parents
+            # (or from any parent when none of them is relevant)
+            changed = rest if relevant_parents else 0
+            if not relevant_parents:
+                for parent in parents:
+                    changed |= addon_mask & mask(blocks.get(parent))
+            block = blocks.get(parents[0], {})
+        else:
+            if parents and parents[0] in relevant:
+                reach[parents[0]] |= addon_mask
+            block = blocks.get("", {})
+            changed = addon_mask & mask(block)
+        if changed:
+            kept[sha] = changed, block
+
+    buckets = defaultdict(dict)
+    # in the git log order of the range rather than of the walk, which may
+    # start from several tips. Like the path limited git logs up to the
+    # commits of the same date, that git orders by its simplified walk.
+    for sha in repo.git.rev_list(f"{start}..{end}").splitlines():
+        if sha in kept:
+            changed, block = kept[sha]
+            for addon, bit in bits.items():
+                if changed & bit:
+                    buckets[addon][sha] = block.get(addon, 0)
+    return buckets
+
+
+def addon_patch_ids(
+    repo: git.Repo, revs: List[str], addons: List[str], root: str = ODOO_ADDONS_ROOT
+) -> Dict[str, Dict[str, str]]:
+    """
+    Compute the stable patch-ids of the non merge commits of the revs
+    restricted to the models of each addon: {addon: {sha: patch_id}}.
+    The patches come from a single git log -p and are hashed by a single
+    git patch-id --stable process, the per addon blocks being told apart
+    by their position (patch-id only echoes hexadecimal ids).
+    """
+    pathspecs = models_pathspecs(addons, root)
+    wanted = set(addons)
+    blocks: List[Tuple[str, str]] = []  # (addon, sha) of each hashed block
+    output: List[bytes] = []
+
+    patch_id = repo.git.patch_id("--stable", as_process=True, istream=subprocess.PIPE)
+    reader = threading.Thread(
+        target=lambda: output.extend(patch_id.stdout), daemon=True
+    )
+    reader.start()
+
+    def flush(sha: Optional[str], chunks: Dict[str, List[bytes]]):
+        for addon, addon_chunks in chunks.items():
+            patch_id.stdin.write(b"commit %040x\n" % len(blocks))
+            patch_id.stdin.writelines(addon_chunks)
+            blocks.append((addon, sha))
+
+    log = repo.git(c="core.quotepath=off").log(
+        *revs,
+        "-p",
+        "--no-merges",
+        "--no-renames",
+        "--no-ext-diff",
+        "--no-color",
+        "--full-index",
+        "--format=%x00%H",
+        "--",
+        *pathspecs,
+        as_process=True,
+    )
+    sha, chunks, addon_chunks = None, {}, None
+    try:
+        for line in log.stdout:
+            if line.startswith(b"\0"):
+                flush(sha, chunks)
+                sha, chunks, addon_chunks = line[1:].decode().strip(), {}, None
+            elif line.startswith(b"diff --git a/"):
+                # no renames: the line is "diff --git a/<path> b/<path>"
+                paths = line[len(b"diff --git a/") :].rstrip(b"\n")
+                path = paths[: (len(paths) - 3) // 2].decode("utf-8", "replace")
+                addon = addon_from_path(path, root)
+                addon_chunks = None
+                if addon in wanted:
+                    addon_chunks = chunks.setdefault(addon, [])
+                    addon_chunks.append(line)
+            elif addon_chunks is not None:
+                addon_chunks.append(line)
+        flush(sha, chunks)
+    finally:
+        patch_id.stdin.close()
+    reader.join()
+    log.wait()
+    patch_id.wait()
+
+    patch_ids = defaultdict(dict)
+    for line in output:
+        pid, block_id = line.decode().split()
+        addon, sha = blocks[int(block_id, 16)]
+        patch_ids[addon][sha] = pid
+    return patch_ids
+
+
+def list_models_blobs(
+    repo: git.Repo,
+    commit: git.Commit,
+    addons: List[str],
+    root: str = ODOO_ADDONS_ROOT,
+) -> Dict[str, List[str]]:
+    """
+    List the python blob shas of the addons models in the commit tree
+    with a single git ls-tree: {addon: [blob_sha]}.
+    """
+    blobs = defaultdict(list)
+    output = repo.git(c="core.quotepath=off").ls_tree(
+        "-r",
+        commit.hexsha,
+        "--",
+        *[addon_models_path(addon, root) for addon in addons],
+    )
+    wanted = set(addons)
+    for line in output.splitlines():
+        meta, path = line.split("\t", 1)
+        _mode, object_type, sha = meta.split()
+        addon = addon_from_path(path, root)
+        if object_type == "blob" and path.endswith(".py") and addon in wanted:
+            blobs[addon].append(sha)
+    return blobs
+
+
+def split_patch(text: bytes) -> List[FilePatch]:
+    """
+    Split a git patch into per file patches exactly like GitPython
+    does it when diffing with create_patch=True.
+    """
+    patches = []
+    previous_header = None
+    for header in Diff.re_header.finditer(text):
+        groups = header.groupdict()
+        a_path = Diff._pick_best_path(
+            groups["a_path"], groups["rename_from"], groups["a_path_fallback"]
+        )
+        b_path = Diff._pick_best_path(
+            groups["b_path"], groups["rename_to"], groups["b_path_fallback"]
+        )
+        if previous_header is not None:
+            patches[-1] = patches[-1]._replace(
+                diff=text[previous_header.end() : header.start()]
+            )
+        patches.append(
+            FilePatch(
+                a_path and a_path.decode("utf-8", "replace"),
+                b_path and b_path.decode("utf-8", "replace"),
+                b"",
+            )
+        )
+        previous_header = header
+    if patches:
+        patches[-1] = patches[-1]._replace(diff=text[previous_header.end() :])
+    return patches
+
+
+def parse_raw_changes(text: bytes) -> List[BlobChange]:
+    """
+    Parse the git diff-tree --raw lines of a commit parent pair.
+    """
+    changes = []
+    for line in text.decode("utf-8", "replace").splitlines():
+        if not line.startswith(":"):
+            continue
+        meta, *paths = line.split("\t")
+        _a_mode, _b_mode, a_blob, b_blob, status = meta[1:].split()
+        a_path = None if status == "A" else paths[0]
+        b_path = None if status == "D" else paths[-1]
+        changes.append(BlobChange(a_path, b_path, a_blob, b_blob))
+    return changes
+
+
+def iter_commit_patches(
+    repo: git.Repo,
+    commits: List[git.Commit],
+    paths: Union[str, List[str]],
+) -> Iterator[Tuple[git.Commit, Dict[str, List[FilePatch]]]]:
+    """
+    Stream the patches of all the commits against each of their parents
+    out of a single git diff-tree --stdin process.
+    Yield (commit, {parent_sha: [FilePatch]}) in the commits order.
+    """
+    return _iter_diff_tree(
+        repo,
+        commits,
+        paths,
+        ["-p", "--no-ext-diff", "--no-color"],
+        split_patch,
+    )
+
+
+def iter_commit_blob_changes(
+    repo: git.Repo,
+    commits: List[git.Commit],
+    paths: Union[str, List[str]],
+) -> Iterator[Tuple[git.Commit, Dict[str, List[BlobChange]]]]:
+    """
+    Stream the changed blob shas of all the commits against each of their
+    parents out of a single git diff-tree --stdin --raw process.
+    Yield (commit, {parent_sha: [BlobChange]}) in the commits order.
+    """
+    return _iter_diff_tree(repo, commits, paths, ["--raw"], parse_raw_changes)
+
+
+def _iter_diff_tree(
+    repo: git.Repo,
+    commits: List[git.Commit],
+    paths: Union[str, List[str]],
+    options: List[str],
+    parse: Callable[[bytes], List],
+) -> Iterator[Tuple[git.Commit, Dict[str, List]]]:
+    if isinstance(paths, str):
+        paths = [paths]
+    proc = repo.git(c="diff.mnemonicPrefix=false").diff_tree(
+        "--stdin",
+        "-r",
+        "--abbrev=40",
+        "--full-index",
+        "-M",
+        *options,
+        "--",
+        *paths,
+        as_process=True,
+        istream=subprocess.PIPE,
+    )
+
+    def feed():
+        # every (commit, parent) pair is preceded by a line git will echo
+        # back so we can tell which pair the following patch belongs to.
+        try:
+            for commit in commits:
+                for parent in commit.parents:
+                    pair = f"{commit.hexsha} {parent.hexsha}"
+                    proc.stdin.write(f":{pair}\n{pair}\n".encode())
+        finally:
+            proc.stdin.close()
+
+    writer = threading.Thread(target=feed, daemon=True)
+    writer.start()
+
+    commit_iter = iter(commits)
+    patches: Dict[str, Dict[str, List]] = defaultdict(dict)
+    sha, parent_sha, chunks = None, None, []
+
+    def flush():
+        if sha is not None and chunks:
+            patches[sha][parent_sha] = parse(b"".join(chunks[1:]))
+
+    for line in proc.stdout:
+        # (raw diff lines start with ":" too but always hold a tab)
+        if line.startswith(b":") and b"\t" not in line:
+            flush()
+            new_sha, parent_sha = line[1:].decode().split()
+            if new_sha != sha and sha is not None:
+                # all the previous commits are complete now
+                for commit in commit_iter:
+                    yield commit, patches.pop(commit.hexsha, {})
+                    if commit.hexsha == sha:
+                        break
+            sha, chunks = new_sha, []
+        else:
+            chunks.append(line)
+    flush()
+    for commit in commit_iter:
+        yield commit, patches.pop(commit.hexsha, {})
+    writer.join()
+    proc.wait()
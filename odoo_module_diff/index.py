@@ -0,0 +1,148 @@
+import json
+import os
+import sqlite3
+from typing import Dict, List, Tuple
+
+INDEX_FILE = "index.sqlite"
+
+
+class ResultIndex:
+    """
+    SQLite index of the scan results with one row per (serie, addon, commit)
+    holding its scores and the path of its patch file (relative to the index)
+    so the results can be queried without parsing the patch files.
+    The raw features of all the scored commits, kept or not, are stored too
+    so they can be classified again with other thresholds.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS commits (
+                serie TEXT NOT NULL,
+                addon TEXT NOT NULL,
+                sha TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                is_noise INTEGER NOT NULL,
+                is_big_feature INTEGER NOT NULL,
+                total_changes INTEGER NOT NULL,
+                matches_rem REAL NOT NULL,
+                matches_add REAL NOT NULL,
+                pr TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                author TEXT NOT NULL,
+                date TEXT NOT NULL,
+                matches TEXT NOT NULL,
+                path TEXT NOT NULL,
+                PRIMARY KEY (serie, addon, sha)
+            )"""
+        )
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS features (
+                serie TEXT NOT NULL,
+                addon TEXT NOT NULL,
+                sha TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                matches_rem REAL NOT NULL,
+                matches_add REAL NOT NULL,
+                matches_feat REAL NOT NULL,
+                total_changes INTEGER NOT NULL,
+                message TEXT NOT NULL,
+                PRIMARY KEY (serie, addon, sha)
+            )"""
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS commits_addon ON commits (addon)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS commits_sha ON commits (sha)")
+        self.conn.commit()
+
+    def clear(self, serie: str, addon: str):
+        """
+        Forget the rows of an addon before it is fully scanned again.
+        """
+        for table in ("commits", "features"):
+            self.conn.execute(
+                f"DELETE FROM {table} WHERE serie=? AND addon=?", (serie, addon)
+            )
+
+    def add_features(
+        self,
+        serie: str,
+        addon: str,
+        sha: str,
+        kind: str,
+        scores: Tuple[float, float, float, int],
+        message: str,
+    ):
+        """
+        Record the raw classification features of a scored commit, kept or
+        not: (matches_rem, matches_add, matches_feat, total_changes) scores,
+        its message and the kind it was classified as.
+        """
+        self.conn.execute(
+            "INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (serie, addon, sha, kind, *scores, message),
+        )
+
+    def features(self, serie: str = "", addon: str = "") -> List[sqlite3.Row]:
+        query = "SELECT * FROM features WHERE 1=1"
+        params = []
+        if serie:
+            query += " AND serie=?"
+            params.append(serie)
+        if addon:
+            query += " AND addon=?"
+            params.append(addon)
+        self.conn.row_factory = sqlite3.Row
+        rows = self.conn.execute(query + " ORDER BY serie, addon", params).fetchall()
+        self.conn.row_factory = None
+        return rows
+
+    def add(self, serie: str, addon: str, idx: int, kind: str, item: Dict, path: str):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO commits VALUES "
+            "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                serie,
+                addon,
+                item["commit_sha"],
+                idx,
+                kind,
+                item["is_noise"],
+                item["is_big_feature"],
+                item["total_changes"],
+                item["matches_rem"],
+                item["matches_add"],
+                item["pr"],
+                item["summary"],
+                item["author"],
+                item["date"],
+                json.dumps(item["matches"]),
+                os.path.relpath(path, os.path.dirname(os.path.abspath(self.path))),
+            ),
+        )
+
+    def merge(self, path: str):
+        """
+        Copy the rows of another index (like the index of a scan shard).
+        The patch paths stay relative to the index so both indexes
+        should sit at the same place of their output tree.
+        """
+        self.conn.commit()
+        self.conn.execute("ATTACH DATABASE ? AS other", (path,))
+        for table in ("commits", "features"):
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {table} SELECT * FROM other.{table}"
+            )
+        self.conn.commit()
+        self.conn.execute("DETACH DATABASE other")
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
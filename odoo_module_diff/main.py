@@ -1,15 +1,68 @@
+import hashlib
+import inspect
+import json
 import math
+import multiprocessing
 import os
 import re
-import subprocess
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import List
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
 
 import git
 import typer
+import typer.core
 from slugify import slugify
 
+from odoo_module_diff.blobs import DEFAULT_BLOB_CACHE_SIZE, BlobCache
+from odoo_module_diff.cache import DEFAULT_CACHE_SIZE, ScoreCache
+from odoo_module_diff.dependencies import (
+    ADDONS_PATHS,
+    MANIFEST_NAMES,
+    dependency_tree,
+    read_manifests,
+)
+from odoo_module_diff.history import (
+    BASE_MODELS_PATH,
+    ODOO_ADDONS_ROOT,
+    BlobChange,
+    FilePatch,
+    addon_models_path,
+    addon_patch_ids,
+    bucket_commits_by_addon,
+    bucket_commits_by_range,
+    commits_changing_names,
+    iter_commit_blob_changes,
+    iter_commit_patches,
+    list_models_blobs,
+    structural_commits_by_addon,
+    union_revs,
+)
+from odoo_module_diff.index import INDEX_FILE, ResultIndex
+from odoo_module_diff.prepare import prepare_repo, warn_unprepared
+from odoo_module_diff.profiling import (
+    enable_profiling,
+    get_profiler,
+    set_profiled_addon,
+    stage,
+)
+from odoo_module_diff.schema import (
+    EMPTY_MODEL,
+    SchemaCache,
+    dotted_name,
+    extract_schema,
+    literal,
+    merge_schemas,
+    schema_change_names,
+    strings,
+)
+
 LINE_CHANGE_THRESHOLD = 25
 LINE_CHANGE_FEAT_THRESHOLD = 140
 LINE_MESSAGE_FEAT_THRESHOLD = 40
@@ -20,7 +73,22 @@ NON_TRIVIAL_FIELD_ATTRS = (
     "recursive=",
     # "inverse=",
 )
+SCHEMA_FIELD_ATTRS = tuple(attr.rstrip("=") for attr in NON_TRIVIAL_FIELD_ATTRS)
+ENGINES = ("lines", "ast")
 ADDON_PREFIX_FILTER = ["l10n_", "website_", "test"]
+# GitHub org/repo of the PRs closed in the commit messages (closes odoo/odoo#123)
+ODOO_PR_REPO = "odoo/odoo"
+GITHUB_REMOTE_REGEX = re.compile(r"github\.com[:/]([\w.-]+/[\w.-]+?)(?:\.git)?/?$")
+
+SCAN_STATE_FILE = ".odoo_module_diff_state.json"
+SPILL_SUFFIX = ".patch.part"  # patches waiting for their final idx/heat name
+
+# release commits that can't be found by their message
+RELEASE_COMMITS = {
+    10: "780869879b00d5772985e7c11003ac8a94451a61",  # [REL] 10.0 \o/
+}
+# release commits found by message are remembered in the git dir
+RELEASE_COMMITS_FILE = "odoo_module_diff_releases.json"
 
 BLACKLISTS = [
     "adapt model class names to correspond to model names",
@@ -28,16 +96,30 @@ BLACKLISTS = [
 ]
 
 
-def find_end_commit_by_serie(repo: git.Repo, target_serie: int):
+def find_end_commit_by_serie(
+    repo: git.Repo,
+    target_serie: int,
+    head: Optional[git.Commit] = None,
+    root: str = ODOO_ADDONS_ROOT,
+):
     """
-    Find the most recent commit with a specific message.
+    Find the most recent commit with a specific message
+    in the history of head (HEAD by default).
+    The hardcoded RELEASE_COMMITS are Odoo ones, only used with the Odoo
+    layout root and when they are in the history of head.
     Return the more recent commit if no match is found.
     """
+    if head is None:
+        head = repo.head.commit
     if target_serie == 16:
         message = "[REL] 16.0 FINAL"
-    if target_serie == 10:  # Odoo I hate you so much
+    if (
+        root == ODOO_ADDONS_ROOT
+        and target_serie in RELEASE_COMMITS
+        and is_ancestor(repo, RELEASE_COMMITS[target_serie], head.hexsha)
+    ):  # Odoo I hate you so much
         # message = "[REL] 10.0 \o/"
-        return repo.commit("780869879b00d5772985e7c11003ac8a94451a61"), True
+        return repo.commit(RELEASE_COMMITS[target_serie]), True
     elif target_serie == 9:
         message = "[REL] Odoo 9"
     elif target_serie == 8:
@@ -45,134 +127,222 @@ def find_end_commit_by_serie(repo: git.Repo, target_serie: int):
     else:
         message = f"[REL] {target_serie}.0"
 
-    last_commit = None
-    for commit in repo.iter_commits():
-        if last_commit is None:
-            last_commit = commit
+    start = time.perf_counter()
+    release_commits = load_release_commits(repo)
+    known_sha = release_commits.get(str(target_serie))
+    if known_sha and is_ancestor(repo, known_sha, head.hexsha):
+        print(f"Release commit found in {time.perf_counter() - start:.2f}s (cached)")
+        return repo.commit(known_sha), True
+
+    try:
+        # let git filter the history instead of loading every commit
+        # and only check the candidates first line in Python.
+        log = repo.git.log(
+            head.hexsha, "-F", f"--grep={message}", "--format=%x00%H%n%B"
+        )
+        found = None
+        for entry in log.split("\0")[1:]:
+            sha, _, commit_message = entry.partition("\n")
+            first_line = (commit_message.splitlines() or [""])[0]
+            if message in first_line and first_line.replace(message, "").strip() == "":
+                found = repo.commit(sha)
+                break
+    except git.GitCommandError:
+        found = find_release_commit_by_walk(repo, head, message)
+
+    print(f"Release commit search took {time.perf_counter() - start:.2f}s")
+    if found is not None:
+        release_commits[str(target_serie)] = found.hexsha
+        save_release_commits(repo, release_commits)
+        return found, True
+    print("WARNING LAST COMMIT BEFORE RELEASE NOT FOUND!")
+    print("Using last commit instead...")
+    return head, False
+
+
+def find_release_commit_by_walk(repo: git.Repo, head: git.Commit, message: str):
+    """
+    Slow fallback walking the whole history from head in Python.
+    """
+    for commit in repo.iter_commits(head):
         if (
             message in str(commit.message.splitlines()[0])
             and commit.message.splitlines()[0].replace(message, "").strip() == ""
         ):
-            return commit, True
-    print("WARNING LAST COMMIT BEFORE RELEASE NOT FOUND!")
-    print("Using last commit instead...")
-    return last_commit, False
+            return commit
+    return None
+
+
+def load_release_commits(repo: git.Repo) -> Dict[str, str]:
+    """
+    Load the serie -> release commit map persisted in the git dir
+    by the previous searches.
+    """
+    try:
+        with open(os.path.join(repo.git_dir, RELEASE_COMMITS_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_release_commits(repo: git.Repo, release_commits: Dict[str, str]):
+    try:
+        with open(os.path.join(repo.git_dir, RELEASE_COMMITS_FILE), "w") as f:
+            json.dump(release_commits, f, indent=2, sort_keys=True)
+    except OSError:  # read only repo, we will just search again
+        pass
+
+
+# line classifier flags: each diff line is classified only once and
+# its flags are then carried in the 3 lines scanning buffer.
+INHERIT = 1  # " _inherit =" in line
+INHERITS = 2  # " _inherits =" in line
+FIELD = 4  # " = fields." in line
+INHERIT_OPEN = 8  # " _inherit =" in line and the list goes on next line
+INHERITS_OPEN = 16  # " _inherits =" in line and the list goes on next line
+FIELD_OPEN = 32  # " = fields." in line and the args go on next line
+TRIVIAL = 64  # only a trivial field attr change
+LINE_MARKERS = (
+    (" _inherit =", INHERIT, "[", INHERIT_OPEN),
+    (" _inherits =", INHERITS, "[", INHERITS_OPEN),
+    (" = fields.", FIELD, "(", FIELD_OPEN),
+)
+OPEN_FLAGS = INHERIT_OPEN | INHERITS_OPEN | FIELD_OPEN
+
+# field type changes that still count as the same field
+FIELD_TYPE_SWAPS = (
+    ("fields.Char", "fields.Text"),
+    ("fields.Char", "fields.Html"),
+    ("fields.Text", "fields.Html"),
+    ("fields.Integer", "fields.Float"),
+)
+# removed fields are indexed by name and type family so a field
+# added again can find its removed counterpart at once.
+FIELD_TYPE_FAMILIES = (
+    ("fields.Char", "fields.<text>"),
+    ("fields.Text", "fields.<text>"),
+    ("fields.Html", "fields.<text>"),
+    ("fields.Integer", "fields.<number>"),
+    ("fields.Float", "fields.<number>"),
+)
+
+
+def classify_line(line: str) -> int:
+    flags = 0
+    for marker, flag, opener, open_flag in LINE_MARKERS:
+        if marker in line:
+            flags |= flag
+            if line.endswith(opener):
+                flags |= open_flag
+    if (
+        # ensure it is not only a trivial attr change
+        not flags & FIELD
+        and line.count("=") == 1
+        and not any(key in line for key in NON_TRIVIAL_FIELD_ATTRS)
+    ):
+        flags |= TRIVIAL
+    return flags
+
+
+def field_key(line: str) -> str:
+    """
+    field name and type of a -/+ field line.
+    """
+    return line[1:].split("(")[0]
+
+
+def field_family(key: str) -> str:
+    for field_type, family in FIELD_TYPE_FAMILIES:
+        key = key.replace(field_type, family)
+    return key
+
+
+def is_same_field(removed_key: str, key: str) -> bool:
+    if removed_key == key:
+        return True
+    for old_type, new_type in FIELD_TYPE_SWAPS:
+        if removed_key.replace(old_type, new_type) == key:
+            return True
+    return False
+
+
+def index_removed_field(line: str, removed_fields: Dict[str, List[tuple]]):
+    key = field_key(line)
+    removed_fields.setdefault(field_family(key), []).append((key, line))
 
 
 def scan_diff_line_removal(
     line: str,
-    score_add: float,
-    score_del: float,
-    score_feat: float,
-    matches: List[str],
+    flags: int,
+    context: int,
     prev_line: str,
     prev_prev_line: str,
-    reset_scanning_buffer: bool,
+    score_del: float,
+    matches: List[str],
+    removed_fields: Dict[str, List[tuple]],
 ):
-    if (
-        " _inherit =" in line
-        or " _inherit =" in prev_line
-        and prev_line.endswith("[")
-        or " _inherit =" in prev_prev_line
-        and prev_prev_line.endswith("[")
-    ) and "AbstractModel" not in (line + prev_line + prev_prev_line):
+    """
+    context holds the open flags of the 2 previous lines.
+    Return the new score_del and if the scanning buffer should be reset.
+    """
+    reset_scanning_buffer = False
+    if (flags & INHERIT or context & INHERIT_OPEN) and "AbstractModel" not in (
+        line + prev_line + prev_prev_line
+    ):
         reset_scanning_buffer = True
         matches.append(line)
         score_del += 1
 
-    elif (
-        " _inherits =" in line
-        or " _inherits =" in prev_line
-        and prev_line.endswith("[")
-        or " _inherits =" in prev_prev_line
-        and prev_prev_line.endswith("[")
-    ) and "AbstractModel" not in (line + prev_line + prev_prev_line):
+    elif (flags & INHERITS or context & INHERITS_OPEN) and "AbstractModel" not in (
+        line + prev_line + prev_prev_line
+    ):
         reset_scanning_buffer = True
         matches.append(line)
         score_del += 1
 
-    elif (
-        " = fields." in line
-        or " = fields." in prev_line
-        and prev_line.endswith("(")
-        or " = fields." in prev_prev_line
-        and prev_prev_line.endswith("(")
-    ) and not (
-        # ensure it is not only a trivial attr change
-        line.count("=") == 1
-        and " = fields." not in line
-        and not any(key in line for key in NON_TRIVIAL_FIELD_ATTRS)
-    ):
+    elif (flags & FIELD or context & FIELD_OPEN) and not flags & TRIVIAL:
         reset_scanning_buffer = True
         matches.append(line)
-        if " = fields." not in line:
+        if not flags & FIELD:
             score_del += 0.4  # wheights less because just an important attr change
         else:
             score_del += 1
         if "2many(" in line:  # relations removal weights more
             score_del += 1
 
-    return (
-        line,
-        score_add,
-        score_del,
-        score_feat,
-        matches,
-        prev_line,
-        prev_prev_line,
-        reset_scanning_buffer,
-    )
+    if reset_scanning_buffer and flags & FIELD:
+        index_removed_field(line, removed_fields)
+
+    return score_del, reset_scanning_buffer
 
 
 def scan_diff_line_addition(
     line: str,
+    flags: int,
     score_add: float,
     score_del: float,
     score_feat: float,
     matches: List[str],
-    prev_line: str,
-    prev_prev_line: str,
-    reset_scanning_buffer: bool,
+    removed_fields: Dict[str, List[tuple]],
 ):
-    if " = fields." in line:
+    """
+    Return the new score_add, score_del, score_feat
+    and if the scanning buffer should be reset.
+    """
+    reset_scanning_buffer = False
+    if flags & FIELD:
         reset_scanning_buffer = True
 
         # is it only a minor attr change to a field removed before?
-        removed_match = None
-        for match in matches:
-            if (
-                not match.startswith("-")
-                # or not match.endswith(")")
-                or " = fields." not in match
-            ):
-                continue
-
-            if (
-                (
-                    match[1:].split("(")[0]
-                    == line[1:].split("(")[0]  # same field name and type
-                )
-                or (
-                    match[1:].split("(")[0].replace("fields.Char", "fields.Text")
-                    == line[1:].split("(")[0]  # same field name and type
-                )
-                or (
-                    match[1:].split("(")[0].replace("fields.Char", "fields.Html")
-                    == line[1:].split("(")[0]  # same field name and type
-                )
-                or (
-                    match[1:].split("(")[0].replace("fields.Text", "fields.Html")
-                    == line[1:].split("(")[0]  # same field name and type
-                )
-                or (
-                    match[1:].split("(")[0].replace("fields.Integer", "fields.Float")
-                    == line[1:].split("(")[0]  # same field name and type
-                )
-            ):
-                removed_match = match
+        line_key = field_key(line)
+        removed = None
+        for candidate in removed_fields.get(field_family(line_key), ()):
+            if is_same_field(candidate[0], line_key):
+                removed = candidate
                 break
 
-        if removed_match:
+        if removed:
+            removed_match = removed[1]
             # new we try to detect trivial field attrs changes:
             non_trivial_prev = set()
             for key in NON_TRIVIAL_FIELD_ATTRS:
@@ -203,6 +373,7 @@ def scan_diff_line_addition(
                     score_del -= 1
 
                 matches.remove(removed_match)
+                removed_fields[field_family(removed[0])].remove(removed)
             else:
                 score_del -= 0.6  # field isn't removed but some important attr changed
                 if "2many(" in line:  # revert relations removal score
@@ -218,39 +389,44 @@ def scan_diff_line_addition(
     else:
         score_add += 0.4  # weights less because only an attr additive change
 
-    return (
-        line,
-        score_add,
-        score_del,
-        score_feat,
-        matches,
-        prev_line,
-        prev_prev_line,
-        reset_scanning_buffer,
-    )
+    return score_add, score_del, score_feat, reset_scanning_buffer
 
 
-def scan_commit(path: str, commit: git.Commit):
+def scan_commit(
+    path: str,
+    commit: git.Commit,
+    patches: Optional[Dict[str, List[FilePatch]]] = None,
+):
     """
     Check if the commit diff contains the specified strings.
     We count a " = fields." match only
     if it's inside a -/+ line or in the 2 lines before.
+    patches can carry the already streamed patches of the commit
+    by parent sha, else each parent diff is asked to git.
     """
     score_del = 0
     score_add = 0
     score_feat = 0
     matches = []
+    removed_fields = {}  # index of the removed fields in matches
     diff_items = []
     for parent in commit.parents:
-        diff = parent.diff(commit, paths=path, create_patch=True)
-        diff_string = ""
+        if patches is None:
+            diff = parent.diff(commit, paths=path, create_patch=True)
+        else:
+            diff = patches.get(parent.hexsha, [])
+        diff_chunks = []
         for diff_item in diff:
             diff_item_string = diff_item.diff.decode("utf-8", errors="ignore")
-            diff_string += f"\n--- a/{diff_item.a_path}\n+++ b/{diff_item.b_path}\n{diff_item_string}"
+            diff_chunks.append(
+                f"\n--- a/{diff_item.a_path}\n+++ b/{diff_item.b_path}\n{diff_item_string}"
+            )
 
             # line, prev_line and prev_prev_line is a kind of 3 lines scanning buffer
             prev_line = ""
             prev_prev_line = ""
+            prev_flags = 0
+            prev_prev_flags = 0
             is_transient_model = False
 
             for line in diff_item_string.splitlines():
@@ -265,76 +441,372 @@ def scan_commit(path: str, commit: git.Commit):
                 if is_transient_model:
                     continue
 
+                flags = classify_line(line)
+                context = (prev_flags | prev_prev_flags) & OPEN_FLAGS
                 if line.startswith("-    ") and not line.startswith("-        "):
-                    (
+                    score_del, reset_scanning_buffer = scan_diff_line_removal(
                         line,
-                        score_add,
-                        score_del,
-                        score_feat,
-                        matches,
+                        flags,
+                        context,
                         prev_line,
                         prev_prev_line,
-                        reset_scanning_buffer,
-                    ) = scan_diff_line_removal(
-                        line,
-                        score_add,
                         score_del,
-                        score_feat,
                         matches,
-                        prev_line,
-                        prev_prev_line,
-                        reset_scanning_buffer,
+                        removed_fields,
                     )
 
                 elif (
                     line.startswith("+    ")
                     and not line.startswith("+        ")
-                    and (
-                        " = fields." in line
-                        or " = fields." in prev_line
-                        and prev_line.endswith("(")
-                        or " = fields." in prev_prev_line
-                        and prev_prev_line.endswith("(")
-                    )
-                    and not (
-                        # ensure it is not only a trivial attr change
-                        line.count("=") == 1
-                        and " = fields." not in line
-                        and not any(key in line for key in NON_TRIVIAL_FIELD_ATTRS)
-                    )
+                    and (flags & FIELD or context & FIELD_OPEN)
+                    and not flags & TRIVIAL
                 ):
                     (
-                        line,
                         score_add,
                         score_del,
                         score_feat,
-                        matches,
-                        prev_line,
-                        prev_prev_line,
                         reset_scanning_buffer,
                     ) = scan_diff_line_addition(
                         line,
+                        flags,
                         score_add,
                         score_del,
                         score_feat,
                         matches,
-                        prev_line,
-                        prev_prev_line,
-                        reset_scanning_buffer,
+                        removed_fields,
                     )
 
                 if reset_scanning_buffer:
                     prev_line = prev_prev_line = ""  # reset the scanning buffer
+                    prev_flags = prev_prev_flags = 0
                 else:
                     prev_prev_line = prev_line
                     prev_line = line
+                    prev_prev_flags = prev_flags
+                    prev_flags = flags
 
         if score_del + score_add + score_feat > 0:
-            diff_items.append(diff_string)
+            diff_items.append("".join(diff_chunks))
+
+    return diff_items, score_del, score_add, score_feat, matches
+
+
+def schema_field_line(name: str, field: List) -> str:
+    field_type, attrs = field
+    args = ", ".join(f"{attr}={value}" for attr, value in sorted(attrs.items()))
+    return f"    {name} = fields.{field_type}({args})"
+
+
+def diff_schemas(old: Dict[str, Dict], new: Dict[str, Dict]):
+    """
+    Score the structural changes between two model schemas the way
+    the line scanners score the -/+ lines of a diff.
+    Return score_del, score_add, score_feat and the -/+ matched lines.
+    """
+    score_del = 0
+    score_add = 0
+    score_feat = 0
+    matches = []
+    for model in sorted(old.keys() | new.keys()):
+        old_model = old.get(model, EMPTY_MODEL)
+        new_model = new.get(model, EMPTY_MODEL)
+        if not old_model["abstract"] and not new_model["abstract"]:
+            for inherit in old_model["inherit"]:
+                if inherit not in new_model["inherit"]:
+                    matches.append(f"-    _inherit = {inherit!r}")
+                    score_del += 1
+            for inherits, field in old_model["inherits"].items():
+                if new_model["inherits"].get(inherits) != field:
+                    matches.append(f"-    _inherits = {{{inherits!r}: {field!r}}}")
+                    score_del += 1
+
+        for name, field in old_model["fields"].items():
+            new_field = new_model["fields"].get(name)
+            if new_field == field:
+                continue
+            if new_field is not None and is_same_field(
+                f"fields.{field[0]}", f"fields.{new_field[0]}"
+            ):
+                if new_field[1] == field[1]:
+                    continue  # only a type swap like Char to Text
+                # field isn't removed but some important attr changed
+                matches.append("-" + schema_field_line(name, field))
+                matches.append("+" + schema_field_line(name, new_field))
+                score_del += 0.4
+                continue
+            matches.append("-" + schema_field_line(name, field))
+            score_del += 1
+            if field[0].endswith("2many"):  # relations removal weights more
+                score_del += 1
+
+        for name, field in new_model["fields"].items():
+            old_field = old_model["fields"].get(name)
+            if old_field is not None and is_same_field(
+                f"fields.{old_field[0]}", f"fields.{field[0]}"
+            ):
+                continue
+            # it's really a new field addition (or a field type change)
+            score_feat += 1
+            if field[0].endswith("2many"):  # adding relations weights more
+                score_add += 1
+                matches.append("+" + schema_field_line(name, field))
+
+    return score_del, score_add, score_feat, matches
+
+
+def scan_commit_schema(
+    commit: git.Commit,
+    changes: Dict[str, List[BlobChange]],
+    schemas: SchemaCache,
+):
+    """
+    Score a commit by diffing the model schemas of its changed models files
+    against each of its parents. The schemas of all the changed files are
+    merged first so a field moved to another file isn't a removal.
+    Return the same values as scan_commit with a schema diff as pseudo patch,
+    or None if some models file can't be parsed.
+    """
+    score_del = 0
+    score_add = 0
+    score_feat = 0
+    matches = []
+    diff_items = []
+    for parent in commit.parents:
+        parent_changes = changes.get(parent.hexsha, [])
+        old_schemas = [schemas.schema(change.a_blob) for change in parent_changes]
+        new_schemas = [schemas.schema(change.b_blob) for change in parent_changes]
+        if None in old_schemas or None in new_schemas:
+            return None
+        old = merge_schemas(old_schemas)
+        new = merge_schemas(new_schemas)
+        parent_del, parent_add, parent_feat, parent_matches = diff_schemas(old, new)
+        score_del += parent_del
+        score_add += parent_add
+        score_feat += parent_feat
+        matches += parent_matches
+        if parent_del + parent_add + parent_feat > 0:
+            paths = "".join(
+                f"\n--- a/{change.a_path}\n+++ b/{change.b_path}"
+                for change in parent_changes
+            )
+            diff_items.append(f"{paths}\n" + "\n".join(parent_matches) + "\n")
 
     return diff_items, score_del, score_add, score_feat, matches
 
 
+def net_change_names(
+    repo: git.Repo,
+    start_commit: git.Commit,
+    end_commit: git.Commit,
+    addons: List[str],
+    schemas: SchemaCache,
+) -> Dict[str, Optional[List[str]]]:
+    """
+    Diff the model schemas of the addons between the start and end trees
+    (read only once each) and return the names of the fields (or _inherit
+    and _inherits) with a net change by addon. Addons without net change
+    are left out and the addons with unparsable models files are mapped
+    to None (their commits can't be filtered).
+    """
+    start_blobs = list_models_blobs(repo, start_commit, addons)
+    end_blobs = list_models_blobs(repo, end_commit, addons)
+    net_names = {}
+    for addon in addons:
+        old_schemas = [schemas.schema(sha) for sha in start_blobs.get(addon, [])]
+        new_schemas = [schemas.schema(sha) for sha in end_blobs.get(addon, [])]
+        if None in old_schemas or None in new_schemas:
+            net_names[addon] = None
+            continue
+        names = schema_change_names(
+            merge_schemas(old_schemas), merge_schemas(new_schemas)
+        )
+        if names:
+            net_names[addon] = sorted(names)
+    return net_names
+
+
+def prune_commits(
+    repo: git.Repo,
+    revs: List[str],
+    addons: List[str],
+    addon_commits: Dict[str, Dict[str, int]],
+    root: str = ODOO_ADDONS_ROOT,
+) -> int:
+    """
+    Remove from addon_commits the commits git log -G says have no -/+ line
+    the line scanners could score in the addon models, so they are never
+    diffed in Python. Return the number of pruned commits.
+    """
+    structural = structural_commits_by_addon(repo, revs, addons, root)
+    pruned = 0
+    for addon in addons:
+        commit_changes = addon_commits.get(addon, {})
+        kept = {
+            sha: changes
+            for sha, changes in commit_changes.items()
+            if sha in structural[addon]
+        }
+        pruned += len(commit_changes) - len(kept)
+        addon_commits[addon] = kept
+    return pruned
+
+
+def skip_forward_ports(
+    addon_commits: Dict[str, Dict[str, int]],
+    patch_ids: Dict[str, Dict[str, str]],
+    reference: Set[str],
+) -> Dict[str, int]:
+    """
+    Remove from addon_commits the commits having the same stable patch-id
+    in the addon models as a commit of the reference (the commits of the
+    earlier series), so forward-ports are not scored again in each serie.
+    Return the number of skipped commits per addon.
+    """
+    duplicates = {}
+    for addon, commit_changes in addon_commits.items():
+        ids = patch_ids.get(addon, {})
+        earlier = {pid for sha, pid in ids.items() if sha in reference}
+        kept = {
+            sha: changes
+            for sha, changes in commit_changes.items()
+            if sha in reference or ids.get(sha) not in earlier
+        }
+        if len(kept) < len(commit_changes):
+            duplicates[addon] = len(commit_changes) - len(kept)
+            addon_commits[addon] = kept
+    return duplicates
+
+
+def report_forward_ports(duplicates: Dict[str, int]):
+    print(
+        f"Skipping {sum(duplicates.values())} commits already in an earlier serie"
+        " (same patch-id):"
+    )
+    for addon, count in sorted(duplicates.items()):
+        print(f"  {addon}: {count}")
+
+
+def heuristics_version(engine: str = "lines") -> str:
+    """
+    Hash of the scanning heuristics so cached scores are invalidated
+    whenever the scanners of the engine or the field attrs are changed.
+    """
+    source = repr((NON_TRIVIAL_FIELD_ATTRS, FIELD_TYPE_SWAPS))
+    if engine == "ast":
+        functions = (
+            dotted_name,
+            literal,
+            strings,
+            extract_schema,
+            merge_schemas,
+            is_same_field,
+            schema_field_line,
+            diff_schemas,
+            scan_commit_schema,
+        )
+    else:
+        source += repr((LINE_MARKERS, OPEN_FLAGS, TRIVIAL, FIELD_TYPE_FAMILIES))
+        functions = (
+            classify_line,
+            field_key,
+            field_family,
+            is_same_field,
+            index_removed_field,
+            scan_diff_line_removal,
+            scan_diff_line_addition,
+            scan_commit,
+        )
+    for function in functions:
+        source += inspect.getsource(function)
+    return hashlib.sha1(source.encode()).hexdigest()[:12]
+
+
+def classify_commit(
+    message: str,
+    matches_rem: float,
+    matches_add: float,
+    matches_feat: float,
+    total_changes: int,
+    change_threshold: int = LINE_CHANGE_THRESHOLD,
+    feat_change_threshold: int = LINE_CHANGE_FEAT_THRESHOLD,
+    feat_message_threshold: int = LINE_MESSAGE_FEAT_THRESHOLD,
+    blacklists: List[str] = BLACKLISTS,
+    pr: Optional[str] = None,
+):
+    """
+    Tell if a scored commit is noise or a big feature with the given
+    thresholds. The skipped noisy commits are logged when pr is given.
+    Return (is_noise, is_big_feature).
+    """
+    summary = message.splitlines()[0]
+    # now some heuristics to keep only relevant commits.
+    # commits removing fields are the most critical to keep.
+    # commits removings or adding just a couple of fields with
+    # a small diff are likely to be trivial and are not kept.
+    is_noise = True
+    is_big_feature = False
+    if (
+        # is a change if many structural removals:
+        matches_rem >= 1
+        and total_changes > change_threshold
+        and len(message.splitlines()) > 20
+        or matches_rem >= 2
+        and total_changes > change_threshold
+        or matches_rem > 2
+        # is a change if some removals and many additions:
+        or matches_rem > 1
+        and matches_add > 3
+        and total_changes > change_threshold
+        # or matches_add > 3
+        # or matches_rem + matches_add > 4
+    ):
+        is_noise = False
+
+    if (
+        not is_noise
+        and matches_rem < 4
+        and matches_rem + matches_add < 5
+        and total_changes < 2 * change_threshold
+        and len(message.splitlines()) < 9
+    ):
+        # medium change without too much removal and very little explanation can be skipped
+        if pr is not None:
+            print(f"SKIPPING NOISY COMMIT FROM PR {pr}", message)
+        is_noise = True
+
+    elif (
+        is_noise
+        and "FIX" not in summary
+        and total_changes > feat_change_threshold
+        and len(message.splitlines()) > feat_message_threshold
+    ) or (
+        is_noise
+        and "FIX" not in summary
+        and matches_add + matches_feat > 5
+        and len(message.splitlines()) > feat_message_threshold
+    ):
+        is_noise = False
+        is_big_feature = True
+
+    for blacklist in blacklists:
+        if blacklist in message:
+            is_noise = True
+            break
+
+    return is_noise, is_big_feature
+
+
+def commit_kind(is_noise: bool, is_big_feature: bool) -> str:
+    """
+    The prefix of the patch file names of a commit.
+    """
+    if is_noise:
+        return "__noise"
+    elif is_big_feature:
+        return "feat"
+    return "c"
+
+
 def scan_addon_commits(
     repo: git.Repo,
     addon: str,
@@ -342,18 +814,70 @@ def scan_addon_commits(
     end_commit: git.Commit,
     output_module_dir: str,
     keep_noise: bool = False,
+    commits: Optional[List[git.Commit]] = None,
+    commit_changes: Optional[Dict[str, int]] = None,
+    cache: Optional[ScoreCache] = None,
+    first_idx: int = 0,
+    index: Optional[ResultIndex] = None,
+    serie: str = "",
+    schemas: Optional[SchemaCache] = None,
+    net_names: Optional[List[str]] = None,
+    root: str = ODOO_ADDONS_ROOT,
+    index_addon: str = "",
+    clear_index: bool = True,
+    pr_repo: str = ODOO_PR_REPO,
 ):
-    if addon == "base":
-        module_path = "odoo/addons/base/models/"
-    else:
-        module_path = f"addons/{addon}/models/"
-
-    # Get the commits between the two found commits
-    commits = list(
-        repo.iter_commits(
-            f"{start_commit.hexsha}..{end_commit.hexsha}", paths=module_path
+    """
+    Scan and write the key commits of an addon. Patch files are numbered
+    from first_idx so an incremental scan can append to previous ones.
+    Each kept commit is spilled to disk right away and only renamed to its
+    chronological idx/heat file name at the end, so memory stays bounded.
+    The written commits are also recorded in the index under serie.
+    Commits are scored from their model schemas when schemas is given
+    (ast engine), else from their patch lines. With net_names, only the
+    commits changing these net changed fields (or inherits) are kept.
+    Return the number of patch files written with their bytes and heat
+    total (the +/-/# of their names) for the serie README.
+    The addon models live in the root dir and are indexed as index_addon
+    (the addon name by default). The previous index rows of the addon are
+    replaced by a full scan (first_idx 0) unless clear_index is off, like
+    for a single commit scan adding its rows to them.
+    The PRs are the ones of the pr_repo GitHub org/repo (none if empty).
+    """
+    module_path = addon_models_path(addon, root)
+    index_addon = index_addon or addon
+    for filename in Path(output_module_dir).glob(f"*{SPILL_SUFFIX}"):
+        filename.unlink()  # left over by an interrupted scan
+    if commits is None:
+        # Get the commits between the two found commits
+        commits = list(
+            repo.iter_commits(
+                f"{start_commit.hexsha}..{end_commit.hexsha}", paths=module_path
+            )
         )
-    )
+    if net_names is not None:
+        # only score the commits changing the declaration of a field
+        # (or _inherit, _inherits) with a net change by the end commit,
+        # the changes of the others were all reverted.
+        with stage("attribute_net_changes"):
+            changed_names = commits_changing_names(
+                repo,
+                [f"{start_commit.hexsha}..{end_commit.hexsha}"],
+                module_path,
+                net_names,
+                NON_TRIVIAL_FIELD_ATTRS,
+            )
+        wanted = set(net_names) | {None}
+        attributed = [
+            commit
+            for commit in commits
+            if changed_names.get(commit.hexsha, set()) & wanted
+        ]
+        print(
+            f"{len(attributed)} of the {len(commits)} commits of {addon} change"
+            f" its {len(net_names)} net changed fields."
+        )
+        commits = attributed
     print(
         f"\n***** scanning {len(commits)} commits in addon: {addon}/models ".ljust(
             80, "*"
@@ -361,7 +885,13 @@ def scan_addon_commits(
     )
 
     result = []
+    features = []
+    patch_bytes = 0
+    unparsable = 0  # commits with models files the ast engine can't parse
 
+    # filter commits on their message first so skipped commits
+    # are never diffed nor counted.
+    candidates = []
     for commit in commits:
         message = commit.message.strip()
         summary = message.splitlines()[0]
@@ -371,107 +901,171 @@ def scan_addon_commits(
             # since previous serie.
             # such false positives were common before version 13.
             continue
+        if (
+            not keep_noise
+            and index is None
+            and any(blacklist in message for blacklist in BLACKLISTS)
+        ):
+            # would be flagged as noise anyway, but their features are
+            # indexed so reclassify can try other blacklists.
+            continue
+        candidates.append(commit)
+
+    cached_shas = set()
+    if cache is not None:
+        # the cached scores are only loaded one by one in the loop
+        # so their diffs don't all sit in memory at once
+        cached_shas = cache.cached_shas(
+            (commit.hexsha for commit in candidates), module_path
+        )
+    iter_changes = iter_commit_patches if schemas is None else iter_commit_blob_changes
+    patch_stream = iter_changes(
+        repo,
+        [commit for commit in candidates if commit.hexsha not in cached_shas],
+        module_path,
+    )
+
+    for commit in candidates:
+        message = commit.message.strip()
+        summary = message.splitlines()[0]
 
         if addon == "base":  # logging progress because base can be very slow...
             print(f"  scanning {commit.hexsha} {summary} ...")
 
-        total_changes = 0
-        for file in commit.stats.files:
-            if str(file).startswith(module_path):
-                total_changes += commit.stats.files[file]["lines"]
+        entry = None
+        if commit.hexsha in cached_shas:
+            entry = cache.get(commit.hexsha, module_path)
+        if entry is not None:
+            (
+                migration_diffs,
+                matches_rem,
+                matches_add,
+                matches_feat,
+                matches,
+                total_changes,
+            ) = entry
+        else:
+            with stage("git_stream"):
+                if commit.hexsha in cached_shas:  # evicted in the meantime
+                    [(_commit, patches)] = iter_changes(repo, [commit], module_path)
+                else:
+                    _commit, patches = next(patch_stream)
+            if commit_changes is not None:
+                total_changes = commit_changes.get(commit.hexsha, 0)
+            else:
+                total_changes = 0
+                for file in commit.stats.files:
+                    if str(file).startswith(module_path):
+                        total_changes += commit.stats.files[file]["lines"]
+
+            with stage("scan_commit", commit.hexsha) as metrics:
+                if schemas is not None:
+                    scores = scan_commit_schema(commit, patches, schemas)
+                    if scores is None:
+                        unparsable += 1
+                        continue
+                    (
+                        migration_diffs,
+                        matches_rem,
+                        matches_add,
+                        matches_feat,
+                        matches,
+                    ) = scores
+                else:
+                    (
+                        migration_diffs,
+                        matches_rem,
+                        matches_add,
+                        matches_feat,
+                        matches,
+                    ) = scan_commit(module_path, commit, patches)
+                if metrics is not None and schemas is None:
+                    metrics["bytes"] = sum(
+                        len(patch.diff)
+                        for parent_patches in patches.values()
+                        for patch in parent_patches
+                    )
+            if cache is not None:
+                cache.put(
+                    commit.hexsha,
+                    module_path,
+                    (
+                        migration_diffs,
+                        matches_rem,
+                        matches_add,
+                        matches_feat,
+                        matches,
+                        total_changes,
+                    ),
+                )
 
-        migration_diffs, matches_rem, matches_add, matches_feat, matches = scan_commit(
-            module_path, commit
-        )
         if matches_rem or matches_add or matches_feat:
             pr = ""
             for line in message.splitlines():
-                if " odoo/odoo#" in str(line):
-                    pr = str(line).split(" odoo/odoo#")[1].strip()
-
-            # now some heuristics to keep only relevant commits.
-            # commits removing fields are the most critical to keep.
-            # commits removings or adding just a couple of fields with
-            # a small diff are likely to be trivial and are not kept.
-            is_noise = True
-            is_big_feature = False
-            if (
-                # is a change if many structural removals:
-                matches_rem >= 1
-                and total_changes > LINE_CHANGE_THRESHOLD
-                and len(message.splitlines()) > 20
-                or matches_rem >= 2
-                and total_changes > LINE_CHANGE_THRESHOLD
-                or matches_rem > 2
-                # is a change if some removals and many additions:
-                or matches_rem > 1
-                and matches_add > 3
-                and total_changes > LINE_CHANGE_THRESHOLD
-                # or matches_add > 3
-                # or matches_rem + matches_add > 4
-            ):
-                is_noise = False
-
-            if (
-                not is_noise
-                and matches_rem < 4
-                and matches_rem + matches_add < 5
-                and total_changes < 2 * LINE_CHANGE_THRESHOLD
-                and len(message.splitlines()) < 9
-            ):
-                # medium change without too much removal and very little explanation can be skipped
-                print(f"SKIPPING NOISY COMMIT FROM PR {pr}", message)
-                is_noise = True
-
-            elif (
-                is_noise
-                and "FIX" not in summary
-                and total_changes > LINE_CHANGE_FEAT_THRESHOLD
-                and len(message.splitlines()) > LINE_MESSAGE_FEAT_THRESHOLD
-            ) or (
-                is_noise
-                and "FIX" not in summary
-                and matches_add + matches_feat > 5
-                and len(message.splitlines()) > LINE_MESSAGE_FEAT_THRESHOLD
-            ):
-                is_noise = False
-                is_big_feature = True
+                if pr_repo and f" {pr_repo}#" in str(line):
+                    pr = str(line).split(f" {pr_repo}#")[1].strip()
 
-            for blacklist in BLACKLISTS:
-                if blacklist in message:
-                    is_noise = True
-                    break
+            is_noise, is_big_feature = classify_commit(
+                message, matches_rem, matches_add, matches_feat, total_changes, pr=pr
+            )
+            features.append(
+                (
+                    commit.hexsha,
+                    commit_kind(is_noise, is_big_feature),
+                    (matches_rem, matches_add, matches_feat, int(total_changes)),
+                    message,
+                )
+            )
 
             # you may switch this test off to fine tune the is_noise computation
             if is_noise and not keep_noise:
                 continue
 
-            result.append(
-                {
-                    "is_noise": is_noise,
-                    "is_big_feature": is_big_feature,
-                    "commit_sha": commit.hexsha,
-                    "total_changes": int(total_changes),
-                    "author": commit.author.name,
-                    "date": datetime.fromtimestamp(commit.committed_date).strftime(
-                        "%Y-%m-%d %H:%M:%S"
-                    ),
-                    "summary": summary,
-                    "message": message,
-                    "pr": f"https://github.com/odoo/odoo/pull/{pr}",
-                    "matches_rem": matches_rem,
-                    "matches_add": matches_add,
-                    "diffs": migration_diffs,
-                    "matches": matches,
-                }
-            )
+            item = {
+                "is_noise": is_noise,
+                "is_big_feature": is_big_feature,
+                "commit_sha": commit.hexsha,
+                "total_changes": int(total_changes),
+                "author": commit.author.name,
+                "date": datetime.fromtimestamp(commit.committed_date).strftime(
+                    "%Y-%m-%d %H:%M:%S"
+                ),
+                "summary": summary,
+                "message": message,
+                "pr": f"https://github.com/{pr_repo}/pull/{pr}" if pr_repo else "",
+                "matches_rem": matches_rem,
+                "matches_add": matches_add,
+                "diffs": migration_diffs,
+                "matches": matches,
+                "spill": f"{output_module_dir}/.{commit.hexsha}{SPILL_SUFFIX}",
+            }
+            os.makedirs(output_module_dir, exist_ok=True)
+            with stage("write_patch"):
+                write_patch(item["spill"], item)
+            patch_bytes += os.path.getsize(item["spill"])
+            # only keep what the rename pass and the index need
+            del item["message"], item["diffs"]
+            result.append(item)
+
+    for _commit, _patches in patch_stream:
+        pass  # let the diff-tree process terminate
+    if unparsable:
+        print(
+            f"WARNING! skipped {unparsable} commits of {addon} with models files"
+            " that can't be parsed (python 2?)."
+        )
 
     # Output the result
-    if result:
-        os.makedirs(output_module_dir, exist_ok=True)
-
+    heat_total = 0
     result.reverse()
-    for idx, item in enumerate(result):
+    # the index is written at the end in a single short transaction so
+    # the parallel workers sharing it never wait for a whole addon scan
+    if index is not None:
+        if first_idx == 0 and clear_index:
+            index.clear(serie, index_addon)
+        for sha, kind, scores, message in features:
+            index.add_features(serie, index_addon, sha, kind, scores, message)
+    for idx, item in enumerate(result, first_idx):
         # print(f"Commit SHA: {item['commit_sha']}")
         print(f"\nTotal Changes: {item['total_changes']}")
         print(
@@ -496,42 +1090,202 @@ def scan_addon_commits(
             13, "_"
         )[: (9 if item["is_big_feature"] else 12)]
 
-        if item["is_noise"]:
-            prefix = "__noise"
-        elif item["is_big_feature"]:
-            prefix = "feat"
-        else:
-            prefix = "c"
+        prefix = commit_kind(item["is_noise"], item["is_big_feature"])
 
         filename = f"{output_module_dir}/{prefix}{str(idx).zfill(3)}{heat}_{item['pr'].split('/')[-1]}_{slugify(item['summary'])[:70]}.patch"
         print(filename)
+        os.replace(item["spill"], filename)
+        heat_total += len(heat) - heat.count("_")
+        if index is not None:
+            index.add(serie, index_addon, idx, prefix, item, filename)
+
+    if index is not None:
+        index.commit()
+    return {"patches": len(result), "bytes": patch_bytes, "heat": heat_total}
+
+
+def write_patch(filename: str, item: Dict):
+    with open(filename, "w") as f:
+        f.write(f"PR: {item['pr']}")
+        f.write(f"\n\nFrom: {item['commit_sha']}")
+        f.write(f"\nFrom: {item['author']}")
+        f.write(f"\nDate: {item['date']}")
+        if not item["is_big_feature"]:
+            f.write(
+                f"\n\nBreaking data model changes scores: del:{item['matches_rem']} + add:{item['matches_add']}, change matches:"
+            )
+        for match in item["matches"]:
+            f.write("\n" + match)
+        f.write(f"\n\nTotal Changes: {item['total_changes']}")
+        f.write("\n\n" + re.sub(r"^-", "*", item["message"], flags=re.MULTILINE))
+        f.write("\n\n" + "=" * 33 + " pseudo patch: " + "=" * 33 + "\n")
+        for diffs in item["diffs"]:
+            f.write(diffs)
 
-        with open(filename, "w") as f:
-            f.write(f"PR: {item['pr']}")
-            f.write(f"\n\nFrom: {item['commit_sha']}")
-            f.write(f"\nFrom: {item['author']}")
-            f.write(f"\nDate: {item['date']}")
-            if not item["is_big_feature"]:
-                f.write(
-                    f"\n\nBreaking data model changes scores: del:{item['matches_rem']} + add:{item['matches_add']}, change matches:"
-                )
-            for match in item["matches"]:
-                f.write("\n" + match)
-            f.write(f"\n\nTotal Changes: {item['total_changes']}")
-            f.write("\n\n" + re.sub(r"^-", "*", item["message"], flags=re.MULTILINE))
-            f.write("\n\n" + "=" * 33 + " pseudo patch: " + "=" * 33 + "\n")
-            for diffs in item["diffs"]:
-                for diff_item in diffs:
-                    f.write(diff_item)
-
-
-def list_addons(repo_path: str, excludes: List[str]):
-    directory = Path(f"{repo_path}/addons")
-    subdirectories = ["base"]
-    for d in directory.iterdir():
-        if not d.is_dir():
+
+def scan_addon_job(
+    repo_path: str,
+    addon: str,
+    start_sha: str,
+    end_sha: str,
+    output_module_dir: str,
+    keep_noise: bool,
+    commit_changes: Dict[str, int],
+    cache_dir: str = "",
+    first_idx: int = 0,
+    profile: bool = False,
+    index_path: str = "",
+    serie: str = "",
+    engine: str = "lines",
+    net_names: Optional[List[str]] = None,
+    root: str = ODOO_ADDONS_ROOT,
+    index_addon: str = "",
+    clear_index: bool = True,
+    pr_repo: str = ODOO_PR_REPO,
+):
+    """
+    Scan an addon in a worker process with its own repo handle
+    (and score cache, index and blob connections). Return the patches stats,
+    the cache hits and misses and the profiling data if any.
+    """
+    profiler = enable_profiling() if profile else None
+    repo = git.Repo(repo_path)
+    cache = ScoreCache(cache_dir, heuristics_version(engine)) if cache_dir else None
+    index = ResultIndex(index_path) if index_path else None
+    schemas = None
+    if engine == "ast":
+        schemas = SchemaCache(BlobCache(repo), SCHEMA_FIELD_ATTRS)
+    set_profiled_addon(index_addon or addon)
+    with stage("scan_addon_commits"):
+        stats = scan_addon_commits(
+            repo,
+            addon,
+            repo.commit(start_sha),
+            repo.commit(end_sha),
+            output_module_dir,
+            keep_noise,
+            commits=[repo.commit(sha) for sha in commit_changes],
+            commit_changes=commit_changes,
+            cache=cache,
+            first_idx=first_idx,
+            index=index,
+            serie=serie,
+            schemas=schemas,
+            net_names=net_names,
+            root=root,
+            index_addon=index_addon,
+            clear_index=clear_index,
+            pr_repo=pr_repo,
+        )
+    result = {"stats": stats, "hits": 0, "misses": 0, "profile": None}
+    if index is not None:
+        index.close()
+    if cache is not None:
+        cache.close()
+        result.update(hits=cache.hits, misses=cache.misses)
+    if profiler is not None:
+        result["profile"] = profiler.data()
+    return result
+
+
+def load_scan_state(output_dir: str) -> Dict:
+    """
+    Load what the previous scan of the serie recorded: its start commit and
+    for each addon the last analysed end commit and next patch index.
+    """
+    try:
+        with open(f"{output_dir}/{SCAN_STATE_FILE}") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_scan_state(output_dir: str, state: Dict):
+    os.makedirs(output_dir, exist_ok=True)
+    with open(f"{output_dir}/{SCAN_STATE_FILE}", "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+
+
+def record_addon_state(
+    state: Dict, addon: str, end_sha: str, stats: Dict[str, int], resumed: bool
+):
+    """
+    Record the end commit of an addon scan and its patches stats,
+    added to the previous ones if the scan resumed a previous scan.
+    """
+    previous = state["addons"].get(addon, {}) if resumed else {}
+    state["addons"][addon] = {
+        "end_commit": end_sha,
+        "next_idx": previous.get("next_idx", 0) + stats["patches"],
+        "bytes": previous.get("bytes", 0) + stats["bytes"],
+        "heat": previous.get("heat", 0) + stats["heat"],
+    }
+
+
+def next_patch_idx(state: Dict, addon: str, range_starts: Dict[str, str]) -> int:
+    if addon not in range_starts:  # full scan
+        return 0
+    return state["addons"][addon]["next_idx"]
+
+
+@lru_cache(maxsize=None)
+def is_ancestor(repo: git.Repo, ancestor: str, descendant: str) -> bool:
+    try:
+        return repo.is_ancestor(ancestor, descendant)
+    except git.GitCommandError:  # the previous end commit may be gone
+        return False
+
+
+def resolve_branch(repo: git.Repo, branch: str) -> Optional[git.Commit]:
+    """
+    Resolve a serie branch without checking it out. Fall back on the
+    origin branch when there is no local one (fresh clones).
+    """
+    for rev in (branch, f"origin/{branch}"):
+        try:
+            return repo.commit(rev)
+        except (git.BadName, ValueError):
             continue
+    return None
+
+
+def github_pr_repo(repo: git.Repo, root: str = ODOO_ADDONS_ROOT) -> str:
+    """
+    The GitHub org/repo of the PRs closed in the commit messages: odoo/odoo
+    for the Odoo layout, else the one of the origin remote (like
+    odoo/enterprise or OCA/sale-workflow), empty if it isn't on GitHub.
+    """
+    if root == ODOO_ADDONS_ROOT:
+        return ODOO_PR_REPO
+    url = repo.git.config("--get", "remote.origin.url", with_exceptions=False)
+    match = GITHUB_REMOTE_REGEX.search(url.strip())
+    return match.group(1) if match else ""
+
 
+def list_addons(commit: git.Commit, excludes: List[str], root: str = ODOO_ADDONS_ROOT):
+    """
+    List the addons from the tree of commit instead of the work tree.
+    Outside of the Odoo layout, only the root subdirectories with a manifest
+    are addons (the top directory of the repo if root is empty).
+    """
+    if root == ODOO_ADDONS_ROOT:
+        subdirectories = ["base"]
+    else:
+        subdirectories = []
+    try:
+        root_tree = commit.tree / root if root else commit.tree
+    except KeyError:
+        print(
+            f"Error! the {root}/ addons root is missing from"
+            f" {commit.repo.working_dir}, use <path>:. for the repos with their"
+            " addons at the top."
+        )
+        exit(1)
+    for d in root_tree.trees:
+        if root != ODOO_ADDONS_ROOT and not any(
+            blob.name in MANIFEST_NAMES for blob in d.blobs
+        ):
+            continue
         is_excluded = False
         for exclude in excludes:
             if d.name.startswith(exclude):
@@ -544,49 +1298,44 @@ def list_addons(repo_path: str, excludes: List[str]):
     return subdirectories
 
 
-def scan(
-    repo_path: str,
+def resolve_serie_range(
+    repo: git.Repo,
     target_serie: int,
-    output_dir: str,
-    addon: str = "",
-    dump_dependencies: bool = False,
-    keep_noise: bool = False,
     commit: str = "",
+    root: str = ODOO_ADDONS_ROOT,
 ):
-    # Initialize local repo object
-    repo = git.Repo(repo_path)
-    force_master_target = False
-
-    print(f"git checkout {target_serie}.0 ...")
-    try:
-        repo.git.checkout(f"{target_serie}.0")
-    except git.GitCommandError as e:
+    """
+    Resolve the target serie branch (or master) and the start and end commits
+    of its migration range. Return (target_serie_commit, start_commit,
+    end_commit, serie) where serie is the last serie released in the range.
+    """
+    print(f"Resolving serie {target_serie}.0 ...")
+    target_serie_commit = resolve_branch(repo, f"{target_serie}.0")
+    if target_serie_commit is None:
         print(
             f"WARNING! serie {target_serie}.0 not found, assuming master branch instead..."
         )
-        force_master_target = True
-        repo.git.checkout("master")
-
-    if addon:
-        addons = [addon]
-    else:
-        addons = list_addons(
-            repo_path,
-            excludes=ADDON_PREFIX_FILTER,
-        )
-    print(f"Will scan {len(addons)} addons. (applied filter {ADDON_PREFIX_FILTER})")
+        target_serie_commit = resolve_branch(repo, "master")
+        if target_serie_commit is None:
+            print("Error! master branch not found!")
+            exit(1)
 
     if commit:
         start_commit = repo.commit(commit).parents[0]
     else:
         # Get the commits for the branches
         print(f"Getting the merge base with previous serie {target_serie - 1}.0 ...")
-        if force_master_target:
-            target_serie_commit = repo.commit("master")
-        else:
-            target_serie_commit = repo.commit(f"{target_serie}.0")
-        prev_serie_commit = repo.commit(f"{target_serie - 1}.0")
+        prev_serie_commit = resolve_branch(repo, f"{target_serie - 1}.0")
+        if prev_serie_commit is None:
+            print(f"Error! previous serie {target_serie - 1}.0 not found!")
+            exit(1)
         merge_base = repo.merge_base(target_serie_commit, prev_serie_commit)
+        if not merge_base:
+            print(
+                f"Error! serie {target_serie}.0 and previous serie"
+                f" {target_serie - 1}.0 have no common ancestor!"
+            )
+            exit(1)
         start_commit = merge_base[0]
 
     start_date = datetime.fromtimestamp(start_commit.committed_date).strftime(
@@ -601,7 +1350,10 @@ def scan(
         end_found = True
     else:
         # Find the end commit
-        end_commit, end_found = find_end_commit_by_serie(repo, target_serie)
+        with stage("find_end_commit"):
+            end_commit, end_found = find_end_commit_by_serie(
+                repo, target_serie, target_serie_commit, root
+            )
         end_date = datetime.fromtimestamp(end_commit.committed_date).strftime(
             "%Y-%m-%d %H:%M:%S"
         )
@@ -619,7 +1371,7 @@ def scan(
     # Ensure both commits are different
     if start_commit == end_commit and not commit:
         print(
-            f"Error! start_commit and end_commit are equal to {start_commit}! You may need to checkout the target serie branch or master first!"
+            f"Error! start_commit and end_commit are equal to {start_commit}! Is the target serie branch or master up to date?"
         )
         exit(1)
 
@@ -627,6 +1379,142 @@ def scan(
         serie = f"{target_serie}.0"
     else:
         serie = f"{target_serie - 1}.0"
+    return target_serie_commit, start_commit, end_commit, serie
+
+
+def select_addons(
+    target_serie_commit: git.Commit, addon: str = "", root: str = ODOO_ADDONS_ROOT
+) -> List[str]:
+    if addon:
+        addons = [addon]
+    else:
+        addons = list_addons(
+            target_serie_commit,
+            excludes=ADDON_PREFIX_FILTER,
+            root=root,
+        )
+    print(f"Will scan {len(addons)} addons. (applied filter {ADDON_PREFIX_FILTER})")
+    return addons
+
+
+def parse_shard(shard: str) -> Tuple[int, int]:
+    """
+    Parse a shard spec like 2/4 (the 2nd shard out of 4).
+    """
+    index, _sep, count = shard.partition("/")
+    try:
+        shard_index, shard_count = int(index), int(count)
+    except ValueError:
+        shard_index, shard_count = 0, 0
+    if not 1 <= shard_index <= shard_count:
+        print(f"Error! invalid shard {shard}, expected i/N with 1 <= i <= N")
+        exit(1)
+    return shard_index, shard_count
+
+
+def shard_addons(
+    addons: List[str], weights: Dict[str, int], shard: Tuple[int, int]
+) -> List[str]:
+    """
+    Split the addons between the shards deterministically, balancing their
+    weight (their number of commits in the range): the heaviest addons are
+    given first to the lightest shard. Return the addons of the shard.
+    """
+    shard_index, shard_count = shard
+    loads = [0] * shard_count
+    selected = set()
+    for addon in sorted(addons, key=lambda addon: (-weights.get(addon, 0), addon)):
+        lightest = loads.index(min(loads))
+        # every addon costs at least its listing and state
+        loads[lightest] += weights.get(addon, 0) + 1
+        if lightest == shard_index - 1:
+            selected.add(addon)
+    print(
+        f"Shard {shard_index}/{shard_count}: {len(selected)} addons"
+        f" (weight {loads[shard_index - 1]} out of {sum(loads)})."
+    )
+    return [addon for addon in addons if addon in selected]
+
+
+def write_dependencies(
+    output_module_dir: str,
+    addon: str,
+    manifests: Dict[str, Dict],
+    serie: str,
+    core_addons: Optional[Set[str]] = None,
+):
+    os.makedirs(output_module_dir, exist_ok=True)
+
+    # expliciting all dependencies can help OpenUpgrade developpers or even improve AI migration training
+    with stage("dependencies"), open(f"{output_module_dir}/dependencies.txt", "w") as f:
+        f.write(dependency_tree(addon, manifests, serie, core_addons))
+
+
+def run_addon_jobs(
+    addon_jobs: List[Tuple[str, Dict]], jobs: int, cache: Optional[ScoreCache] = None
+) -> Dict[str, Dict[str, int]]:
+    """
+    Run the (key, scan_addon_job kwargs) jobs in a pool of jobs worker
+    processes, in their order. The worker cache hits and profiling data
+    are collected. Return the patches stats by key.
+    """
+    stats = {}
+    with ProcessPoolExecutor(
+        max_workers=jobs, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        futures = [
+            (key, executor.submit(scan_addon_job, **kwargs))
+            for key, kwargs in addon_jobs
+        ]
+        for key, future in futures:
+            result = future.result()
+            stats[key] = result["stats"]
+            if cache is not None:
+                cache.hits += result["hits"]
+                cache.misses += result["misses"]
+            if result["profile"]:
+                get_profiler().merge(result["profile"])
+    return stats
+
+
+def scan_addons(
+    repo: git.Repo,
+    repo_path: str,
+    addons: List[str],
+    start_commit: git.Commit,
+    end_commit: git.Commit,
+    addon_commits: Dict[str, Dict[str, int]],
+    output_dir: str,
+    serie: str,
+    dump_dependencies: bool = False,
+    keep_noise: bool = False,
+    jobs: int = 1,
+    cache: Optional[ScoreCache] = None,
+    cache_dir: str = "",
+    first_idxs: Optional[Dict[str, int]] = None,
+    index: Optional[ResultIndex] = None,
+    index_serie: str = "",
+    manifests: Optional[Dict[str, Dict]] = None,
+    schemas: Optional[SchemaCache] = None,
+    net_names: Optional[Dict[str, List[str]]] = None,
+    clear_index: bool = True,
+) -> Dict[str, int]:
+    """
+    Scan the bucketed commits of the addons serially or with a pool of
+    jobs worker processes. Results are indexed under index_serie (see
+    clear_index of scan_addon_commits) and the dependencies are rendered
+    from the manifests when dumped.
+    Commits are scored with the ast engine when schemas is given.
+    With net_names, the addons without net change are skipped.
+    Return the patches stats of scan_addon_commits per addon.
+    """
+    first_idxs = first_idxs or {}
+    addon_stats = {}
+    if net_names is not None:
+        for addon in addons:
+            if addon not in net_names:
+                addon_stats[addon] = {"patches": 0, "bytes": 0, "heat": 0}
+        addons = [addon for addon in addons if addon in net_names]
 
     for addon in addons:
         output_module_dir = (
@@ -634,93 +1522,975 @@ def scan(
         )
 
         if dump_dependencies:  # TODO move to scan_addon_commits
-            os.makedirs(output_module_dir, exist_ok=True)
+            write_dependencies(output_module_dir, addon, manifests or {}, serie)
 
-            # expliciting all dependencies can help OpenUpgrade developpers or even improve AI migration training
-            result = subprocess.run(
-                [
-                    "manifestoo",
-                    "--addons-path",
-                    "odoo/src/addons",
-                    f"--odoo-series={serie}",
-                    "--select",
+        if jobs <= 1:
+            set_profiled_addon(addon)
+            with stage("scan_addon_commits"):
+                addon_stats[addon] = scan_addon_commits(
+                    repo,
                     addon,
-                    "tree",
+                    start_commit,
+                    end_commit,
+                    output_module_dir,
+                    keep_noise,
+                    commits=[repo.commit(sha) for sha in addon_commits.get(addon, {})],
+                    commit_changes=addon_commits.get(addon, {}),
+                    cache=cache,
+                    first_idx=first_idxs.get(addon, 0),
+                    index=index,
+                    serie=index_serie,
+                    schemas=schemas,
+                    net_names=net_names and net_names[addon],
+                    clear_index=clear_index,
+                )
+            set_profiled_addon("")
+
+    if jobs > 1:
+        # the addons with the most commits are scheduled first
+        # so a long addon like base doesn't finish alone at the end.
+        ordered_addons = sorted(
+            addons, key=lambda addon: len(addon_commits.get(addon, {})), reverse=True
+        )
+        addon_stats.update(
+            run_addon_jobs(
+                [
+                    (
+                        addon,
+                        dict(
+                            repo_path=repo_path,
+                            addon=addon,
+                            start_sha=start_commit.hexsha,
+                            end_sha=end_commit.hexsha,
+                            output_module_dir=f"{output_dir}/{addon}",
+                            keep_noise=keep_noise,
+                            commit_changes=addon_commits.get(addon, {}),
+                            cache_dir=cache_dir,
+                            first_idx=first_idxs.get(addon, 0),
+                            profile=get_profiler() is not None,
+                            index_path=index.path if index is not None else "",
+                            serie=index_serie,
+                            engine="lines" if schemas is None else "ast",
+                            net_names=net_names and net_names[addon],
+                            clear_index=clear_index,
+                        ),
+                    )
+                    for addon in ordered_addons
                 ],
-                capture_output=True,
-                text=True,
+                jobs,
+                cache,
             )
-            manifestoo_output = result.stdout
-            with open(f"{output_module_dir}/dependencies.txt", "w") as f:
-                f.write(manifestoo_output)
+        )
+    return addon_stats
 
-        scan_addon_commits(
-            repo, addon, start_commit, end_commit, output_module_dir, keep_noise
+
+def scan(
+    repo_path: str,
+    target_serie: int,
+    output_dir: str,
+    addon: str = "",
+    dump_dependencies: bool = False,
+    keep_noise: bool = False,
+    commit: str = "",
+    jobs: int = 1,
+    cache_dir: str = "",
+    cache_size: int = DEFAULT_CACHE_SIZE,
+    incremental: bool = False,
+    index_path: str = "",
+    blob_cache_size: int = DEFAULT_BLOB_CACHE_SIZE,
+    engine: str = "lines",
+    net_first: bool = False,
+    prefilter: bool = False,
+    dedup: bool = False,
+    shard: Optional[Tuple[int, int]] = None,
+):
+    # Initialize local repo object
+    # (the work tree is never checked out so bare mirrors work too)
+    repo = git.Repo(repo_path)
+    warn_unprepared(repo)
+    blobs = BlobCache(repo, blob_cache_size)
+    schemas = None
+    if engine == "ast":
+        schemas = SchemaCache(blobs, SCHEMA_FIELD_ATTRS)
+
+    target_serie_commit, start_commit, end_commit, serie = resolve_serie_range(
+        repo, target_serie, commit
+    )
+    addons = select_addons(target_serie_commit, addon)
+    range_commits = None
+    if shard:
+        # every shard walks the whole range so they all weight the addons alike
+        with stage("history_walk"):
+            range_commits = bucket_commits_by_addon(
+                repo, start_commit, end_commit, addons
+            )
+        addons = shard_addons(
+            addons, {addon: len(range_commits[addon]) for addon in addons}, shard
         )
+    manifests = None
+    if dump_dependencies:
+        with stage("read_manifests"):
+            manifests = read_manifests(target_serie_commit, blobs)
 
+    cache = None
+    if cache_dir:
+        cache = ScoreCache(cache_dir, heuristics_version(engine), cache_size)
+    index = ResultIndex(index_path) if index_path else None
 
-def create_serie_readme(target_serie: int, output_dir: str):
-    result = subprocess.run(
-        ["find", ".", "-type", "f", "-name", "*.patch"],
-        capture_output=True,
-        cwd=output_dir,
-        text=True,
+    if commit:
+        # a single commit scan adds its patches to the previous scan
+        # results, its range is never recorded in the scan state.
+        state = {"start_commit": start_commit.hexsha, "addons": {}}
+    else:
+        state = load_scan_state(output_dir)
+    if state.get("start_commit") != start_commit.hexsha:
+        if state.get("start_commit"):
+            print("WARNING! the start commit changed, doing a full scan...")
+        # the patches of the previous range are obsolete
+        for addon in state.get("addons", {}):
+            for filename in Path(f"{output_dir}/{addon}").glob("*.patch"):
+                filename.unlink()
+            if index is not None:
+                index.clear(f"{target_serie}.0", addon)
+        if index is not None:
+            index.commit()
+        state = {"start_commit": start_commit.hexsha, "addons": {}}
+        # so an interrupted scan doesn't leave a state listing deleted patches
+        save_scan_state(output_dir, state)
+    range_starts = {}  # addon -> sha the history walk should start from
+    if incremental and not commit:
+        for addon in addons:
+            addon_state = state["addons"].get(addon)
+            if addon_state is None:
+                continue
+            if not is_ancestor(repo, addon_state["end_commit"], end_commit.hexsha):
+                print(
+                    f"WARNING! history of {addon} was rewritten, doing a full scan..."
+                )
+                for filename in Path(f"{output_dir}/{addon}").glob("*.patch"):
+                    filename.unlink()
+                del state["addons"][addon]
+                continue
+            range_starts[addon] = addon_state["end_commit"]
+
+    # a single history walk for all the addons instead of one per addon
+    # (or one per distinct previous end commit in incremental mode)
+    addon_commits = {}
+    walks = defaultdict(list)
+    for addon in addons:
+        walks[range_starts.get(addon, start_commit.hexsha)].append(addon)
+    for range_start, walk_addons in walks.items():
+        if range_start == end_commit.hexsha:
+            continue  # nothing new
+        with stage("history_walk"):
+            if range_start == start_commit.hexsha and range_commits is not None:
+                walked = range_commits  # already walked to shard the addons
+            else:
+                walked = bucket_commits_by_addon(
+                    repo, repo.commit(range_start), end_commit, walk_addons
+                )
+            addon_commits.update(
+                {addon: walked[addon] for addon in walk_addons if addon in walked}
+            )
+        if prefilter:
+            with stage("pickaxe"):
+                pruned = prune_commits(
+                    repo,
+                    [f"{range_start}..{end_commit.hexsha}"],
+                    walk_addons,
+                    addon_commits,
+                )
+            print(f"Pickaxe pre-filter pruned {pruned} commits.")
+
+    if dedup and addon_commits:
+        prev_serie_commit = resolve_branch(repo, f"{target_serie - 1}.0")
+        with stage("patch_ids"):
+            # forward-ports come from the previous serie branch since the fork
+            patch_ids = addon_patch_ids(
+                repo,
+                [end_commit.hexsha, prev_serie_commit.hexsha, f"^{start_commit}"],
+                addons,
+            )
+            reference = set(
+                repo.git.rev_list(f"{start_commit}..{prev_serie_commit}").split()
+            )
+        report_forward_ports(skip_forward_ports(addon_commits, patch_ids, reference))
+
+    net_names = None
+    if net_first:
+        with stage("net_schema_diff"):
+            net_names = net_change_names(
+                repo,
+                start_commit,
+                end_commit,
+                addons,
+                schemas or SchemaCache(blobs, SCHEMA_FIELD_ATTRS),
+            )
+        print(
+            f"Skipping {len(addons) - len(net_names)} addons without net structural change."
+        )
+
+    first_idxs = {addon: next_patch_idx(state, addon, range_starts) for addon in addons}
+    addon_stats = scan_addons(
+        repo,
+        repo_path,
+        addons,
+        start_commit,
+        end_commit,
+        addon_commits,
+        output_dir,
+        serie,
+        dump_dependencies,
+        keep_noise,
+        jobs,
+        cache,
+        cache_dir,
+        first_idxs,
+        index,
+        f"{target_serie}.0",
+        manifests,
+        schemas,
+        net_names,
+        clear_index=not commit,
+    )
+    if index is not None:
+        index.close()
+    blobs.report()
+    if schemas is not None:
+        schemas.report()
+
+    if cache is not None:
+        print(f"Score cache: {cache.hits} hits, {cache.misses} misses")
+        cache.prune()
+        cache.close()
+
+    if not commit:
+        for addon in addons:
+            record_addon_state(
+                state,
+                addon,
+                end_commit.hexsha,
+                addon_stats[addon],
+                addon in range_starts,
+            )
+        state["target_serie"] = target_serie
+        save_scan_state(output_dir, state)
+        create_serie_readme(target_serie, output_dir, state["addons"])
+
+
+def scan_series(
+    repo_path: str,
+    target_series: List[int],
+    output_dir: str,
+    addon: str = "",
+    dump_dependencies: bool = False,
+    keep_noise: bool = False,
+    jobs: int = 1,
+    cache_dir: str = "",
+    cache_size: int = DEFAULT_CACHE_SIZE,
+    index_path: str = "",
+    blob_cache_size: int = DEFAULT_BLOB_CACHE_SIZE,
+    engine: str = "lines",
+    net_first: bool = False,
+    prefilter: bool = False,
+    dedup: bool = False,
+    shard: Optional[Tuple[int, int]] = None,
+):
+    """
+    Scan consecutive series in one batch, each into output_dir/<serie>.0.
+    All the ranges are resolved up front and their history is walked only
+    once. The commits shared by several ranges are scored only once through
+    the score cache (a temporary one if no cache_dir is given).
+    """
+    repo = git.Repo(repo_path)
+    warn_unprepared(repo)
+    blobs = BlobCache(repo, blob_cache_size)
+    schemas = None
+    if engine == "ast":
+        schemas = SchemaCache(blobs, SCHEMA_FIELD_ATTRS)
+
+    ranges = {}
+    serie_addons = {}
+    for target_serie in target_series:
+        ranges[target_serie] = resolve_serie_range(repo, target_serie)
+        serie_addons[target_serie] = select_addons(ranges[target_serie][0], addon)
+    all_addons = sorted(set().union(*serie_addons.values()))
+
+    sha_ranges = {
+        target_serie: (serie_range[1].hexsha, serie_range[2].hexsha)
+        for target_serie, serie_range in ranges.items()
+    }
+    with stage("history_walk"):
+        serie_commits = bucket_commits_by_range(repo, sha_ranges, all_addons)
+    if shard:
+        # an addon is scanned by the same shard in all the series
+        weights = defaultdict(int)
+        for addon_commits in serie_commits.values():
+            for addon, commit_changes in addon_commits.items():
+                weights[addon] += len(commit_changes)
+        all_addons = shard_addons(all_addons, weights, shard)
+        sharded = set(all_addons)
+        for target_serie, addons in serie_addons.items():
+            serie_addons[target_serie] = [addon for addon in addons if addon in sharded]
+    if prefilter:
+        with stage("pickaxe"):
+            # the union of the series ranges is pruned at once
+            union_commits = defaultdict(dict)
+            for addon_commits in serie_commits.values():
+                for addon, commit_changes in addon_commits.items():
+                    union_commits[addon].update(commit_changes)
+            pruned = prune_commits(
+                repo, union_revs(repo, sha_ranges), all_addons, union_commits
+            )
+            for addon_commits in serie_commits.values():
+                for addon, commit_changes in addon_commits.items():
+                    addon_commits[addon] = {
+                        sha: changes
+                        for sha, changes in commit_changes.items()
+                        if sha in union_commits[addon]
+                    }
+        print(f"Pickaxe pre-filter pruned {pruned} commits.")
+    if dedup:
+        prev_ranges = {
+            (target_serie, "prev"): (
+                sha_ranges[target_serie][0],
+                resolve_branch(repo, f"{target_serie - 1}.0").hexsha,
+            )
+            for target_serie in target_series
+        }
+        with stage("patch_ids"):
+            # a single patch-id pass over the series ranges and the previous
+            # serie branches since their fork the forward-ports come from
+            patch_ids = addon_patch_ids(
+                repo, union_revs(repo, {**sha_ranges, **prev_ranges}), all_addons
+            )
+        earlier = set()
+        for target_serie in target_series:
+            start, end = sha_ranges[target_serie]
+            reference = earlier | set(
+                repo.git.rev_list(
+                    "{}..{}".format(*prev_ranges[(target_serie, "prev")])
+                ).split()
+            )
+            print(f"Serie {target_serie}.0:")
+            report_forward_ports(
+                skip_forward_ports(serie_commits[target_serie], patch_ids, reference)
+            )
+            earlier |= set(repo.git.rev_list(f"{start}..{end}").split())
+
+    index = ResultIndex(index_path) if index_path else None
+    with tempfile.TemporaryDirectory() as tmp_cache_dir:
+        cache = ScoreCache(
+            cache_dir or tmp_cache_dir, heuristics_version(engine), cache_size
+        )
+        for target_serie in target_series:
+            _target_serie_commit, start_commit, end_commit, serie = ranges[target_serie]
+            serie_output_dir = f"{output_dir}/{target_serie}.0"
+            print(f"\nScanning serie {target_serie}.0 into {serie_output_dir} ...")
+            addons = serie_addons[target_serie]
+            manifests = None
+            if dump_dependencies:
+                with stage("read_manifests"):
+                    manifests = read_manifests(ranges[target_serie][0], blobs)
+            net_names = None
+            if net_first:
+                with stage("net_schema_diff"):
+                    net_names = net_change_names(
+                        repo,
+                        start_commit,
+                        end_commit,
+                        addons,
+                        schemas or SchemaCache(blobs, SCHEMA_FIELD_ATTRS),
+                    )
+            addon_stats = scan_addons(
+                repo,
+                repo_path,
+                addons,
+                start_commit,
+                end_commit,
+                serie_commits[target_serie],
+                serie_output_dir,
+                serie,
+                dump_dependencies,
+                keep_noise,
+                jobs,
+                cache,
+                cache_dir or tmp_cache_dir,
+                index=index,
+                index_serie=f"{target_serie}.0",
+                manifests=manifests,
+                schemas=schemas,
+                net_names=net_names,
+            )
+            state = {
+                "start_commit": start_commit.hexsha,
+                "target_serie": target_serie,
+                "addons": {},
+            }
+            for addon in addons:
+                record_addon_state(
+                    state, addon, end_commit.hexsha, addon_stats[addon], False
+                )
+            save_scan_state(serie_output_dir, state)
+            create_serie_readme(target_serie, serie_output_dir, state["addons"])
+
+        blobs.report()
+        if schemas is not None:
+            schemas.report()
+        print(f"Score cache: {cache.hits} hits, {cache.misses} misses")
+        if cache_dir:
+            cache.prune()
+        cache.close()
+    if index is not None:
+        index.close()
+
+
+class RepoScan(NamedTuple):
+    """
+    A repo of a multi repo scan with its resolved range and bucketed commits.
+    """
+
+    prefix: str
+    path: str
+    root: str
+    repo: git.Repo
+    start_commit: git.Commit
+    end_commit: git.Commit
+    serie: str
+    addons: List[str]
+    addon_commits: Dict[str, Dict[str, int]]
+    pr_repo: str
+
+
+def parse_repo_spec(spec: str) -> Tuple[str, str, str]:
+    """
+    Parse a [prefix=]path[:addons_root] repo spec into (prefix, path, root).
+    The prefix defaults to the repo dir name and the addons root to the Odoo
+    layout, use . for the repos with their addons at the top like OCA ones.
+    """
+    prefix, _sep, path = spec.rpartition("=")
+    path, _sep, root = path.partition(":")
+    if not _sep:
+        root = ODOO_ADDONS_ROOT
+    root = root.strip("/")
+    if root == ".":
+        root = ""
+    return prefix or os.path.basename(os.path.abspath(path)), path, root
+
+
+def scan_repos(
+    repo_specs: List[Tuple[str, str, str]],
+    target_serie: int,
+    output_dir: str,
+    dump_dependencies: bool = False,
+    keep_noise: bool = False,
+    jobs: int = 1,
+    cache_dir: str = "",
+    cache_size: int = DEFAULT_CACHE_SIZE,
+    index_path: str = "",
+    blob_cache_size: int = DEFAULT_BLOB_CACHE_SIZE,
+    engine: str = "lines",
+    prefilter: bool = False,
+):
+    """
+    Scan the serie in several (prefix, path, addons root) repos at once.
+    The serie range is resolved and walked in each repo, then the addons of
+    all the repos are scanned in a single pool of jobs worker processes into
+    output_dir/<prefix>/<addon> with a single state, README and index where
+    the addons are named <prefix>/<addon>.
+    """
+    repos = []
+    manifests: Dict[str, Dict] = {}
+    core_addons: Set[str] = set()  # the addons of the Odoo layout repos
+    for prefix, repo_path, root in repo_specs:
+        print(f"\nPreparing the scan of {prefix} ({repo_path}) ...")
+        repo = git.Repo(repo_path)
+        warn_unprepared(repo)
+        target_serie_commit, start_commit, end_commit, serie = resolve_serie_range(
+            repo, target_serie, root=root
+        )
+        addons = select_addons(target_serie_commit, root=root)
+        with stage("history_walk"):
+            addon_commits = bucket_commits_by_addon(
+                repo, start_commit, end_commit, addons, root
+            )
+        if prefilter:
+            with stage("pickaxe"):
+                pruned = prune_commits(
+                    repo,
+                    [f"{start_commit}..{end_commit}"],
+                    addons,
+                    addon_commits,
+                    root,
+                )
+            print(f"Pickaxe pre-filter pruned {pruned} commits.")
+        if dump_dependencies:
+            # the dependencies may live in the other repos (like community)
+            with stage("read_manifests"):
+                addons_paths = ADDONS_PATHS if root == ODOO_ADDONS_ROOT else (root,)
+                repo_manifests = read_manifests(target_serie_commit, None, addons_paths)
+                if root == ODOO_ADDONS_ROOT:
+                    core_addons.update(repo_manifests)
+                manifests.update(repo_manifests)
+        repos.append(
+            RepoScan(
+                prefix,
+                repo_path,
+                root,
+                repo,
+                start_commit,
+                end_commit,
+                serie,
+                addons,
+                addon_commits,
+                github_pr_repo(repo, root),
+            )
+        )
+
+    cache = None
+    if cache_dir:
+        cache = ScoreCache(cache_dir, heuristics_version(engine), cache_size)
+    index = ResultIndex(index_path) if index_path else None
+    index_serie = f"{target_serie}.0"
+    state = {"target_serie": target_serie, "repos": {}, "addons": {}}
+    addon_stats = {}
+    addon_jobs = []
+    weights = {}
+    for scan_repo in repos:
+        repo, start, end = scan_repo.repo, scan_repo.start_commit, scan_repo.end_commit
+        root, commits = scan_repo.root, scan_repo.addon_commits
+        state["repos"][scan_repo.prefix] = {
+            "path": os.path.abspath(scan_repo.path),
+            "root": root,
+            "start_commit": start.hexsha,
+            "end_commit": end.hexsha,
+        }
+        schemas = None
+        if engine == "ast" and jobs <= 1:
+            schemas = SchemaCache(BlobCache(repo, blob_cache_size), SCHEMA_FIELD_ATTRS)
+        for addon in scan_repo.addons:
+            key = f"{scan_repo.prefix}/{addon}"
+            output_module_dir = f"{output_dir}/{key}"
+            if dump_dependencies:
+                write_dependencies(
+                    output_module_dir, addon, manifests, scan_repo.serie, core_addons
+                )
+            if jobs <= 1:
+                set_profiled_addon(key)
+                with stage("scan_addon_commits"):
+                    addon_stats[key] = scan_addon_commits(
+                        repo,
+                        addon,
+                        start,
+                        end,
+                        output_module_dir,
+                        keep_noise,
+                        commits=[repo.commit(sha) for sha in commits.get(addon, {})],
+                        commit_changes=commits.get(addon, {}),
+                        cache=cache,
+                        index=index,
+                        serie=index_serie,
+                        schemas=schemas,
+                        root=root,
+                        index_addon=key,
+                        pr_repo=scan_repo.pr_repo,
+                    )
+                set_profiled_addon("")
+            else:
+                addon_jobs.append(
+                    (
+                        key,
+                        dict(
+                            repo_path=scan_repo.path,
+                            addon=addon,
+                            start_sha=start.hexsha,
+                            end_sha=end.hexsha,
+                            output_module_dir=output_module_dir,
+                            keep_noise=keep_noise,
+                            commit_changes=commits.get(addon, {}),
+                            cache_dir=cache_dir,
+                            profile=get_profiler() is not None,
+                            index_path=index_path,
+                            serie=index_serie,
+                            engine=engine,
+                            root=root,
+                            index_addon=key,
+                            pr_repo=scan_repo.pr_repo,
+                        ),
+                    )
+                )
+                weights[key] = len(commits.get(addon, {}))
+    if addon_jobs:
+        # a single pool for all the repos, the addons with the most
+        # commits of any repo being scheduled first
+        addon_jobs.sort(key=lambda addon_job: weights[addon_job[0]], reverse=True)
+        addon_stats.update(run_addon_jobs(addon_jobs, jobs, cache))
+
+    if index is not None:
+        index.close()
+    if cache is not None:
+        print(f"Score cache: {cache.hits} hits, {cache.misses} misses")
+        cache.prune()
+        cache.close()
+    for scan_repo in repos:
+        for addon in scan_repo.addons:
+            key = f"{scan_repo.prefix}/{addon}"
+            record_addon_state(
+                state, key, scan_repo.end_commit.hexsha, addon_stats[key], False
+            )
+    save_scan_state(output_dir, state)
+    create_serie_readme(target_serie, output_dir, state["addons"])
+
+
+def human_size(size: float) -> str:
+    """
+    Format a byte size the way du -h does.
+    """
+    unit = ""
+    for next_unit in ("K", "M", "G"):
+        if size < 1024:
+            break
+        size /= 1024
+        unit = next_unit
+    if unit and math.ceil(size * 10) < 100:
+        return f"{math.ceil(size * 10) / 10:.1f}{unit}"
+    return f"{math.ceil(size)}{unit}"
+
+
+def create_serie_readme(
+    target_serie: int, output_dir: str, addons_state: Dict[str, Dict], top: int = 30
+):
+    """
+    Write the serie README from the patches stats recorded in the scan state
+    instead of crawling the patch files.
+    """
+    commits = sum(addon_state["next_idx"] for addon_state in addons_state.values())
+    commits_size = human_size(
+        sum(addon_state.get("bytes", 0) for addon_state in addons_state.values())
     )
-    commits = len(result.stdout.splitlines())
-
-    commits_size = subprocess.run(
-        ["du", "-sh", "."],
-        capture_output=True,
-        cwd=output_dir,
-        text=True,
-    ).stdout
-
-    command = 'du -sh -- */ | sort -rh | head -n 30 | awk \'{sub(/\\/$/, "", $2); print NR ". " $2 " - " $1}\''
-    result = subprocess.run(
-        command, shell=True, capture_output=True, cwd=output_dir, text=True
+    ranked_addons = sorted(
+        (
+            (addon_state.get("heat", 0), addon_state.get("bytes", 0), addon)
+            for addon, addon_state in addons_state.items()
+            if addon_state["next_idx"]
+        ),
+        reverse=True,
+    )[:top]
+    table = "".join(
+        f"{rank}. {addon} - {human_size(size)} (heat {heat})\n"
+        for rank, (heat, size, addon) in enumerate(ranked_addons, 1)
     )
-    table = result.stdout
 
     readme = f"""# How crazy it is to migrate to Odoo {target_serie}.0?
 
 There are {commits} non trivial commits impacting the database structure to migrate
-from Odoo {target_serie -1}.0 to {target_serie}.0
+from Odoo {target_serie - 1}.0 to {target_serie}.0
 Together theses commits weight {commits_size}.
 
 The addons that changed the most are listed below with their relative migration commit sizes:
-    """
+
+{table}"""
 
     with open(f"{output_dir}/README.md", "w") as f:
         f.write(readme)
 
 
-app = typer.Typer()
+def merge_shards(shard_dirs: List[str], output_dir: str, index_path: str = ""):
+    """
+    Merge the output dirs of the shards of a scan into output_dir: the addon
+    dirs of their scanned series are copied, their scan states and indexes
+    are merged and the serie READMEs are written again from the whole state.
+    """
+    output_dir = os.path.abspath(output_dir)
+    index = ResultIndex(index_path or f"{output_dir}/{INDEX_FILE}")
+    states: Dict[str, Dict] = {}
+    for shard_dir in shard_dirs:
+        shard_dir = os.path.abspath(shard_dir)
+        if os.path.exists(f"{shard_dir}/{SCAN_STATE_FILE}"):  # a single serie
+            serie_dirs = [(shard_dir, output_dir)]
+        else:
+            serie_dirs = [
+                (str(path), f"{output_dir}/{path.name}")
+                for path in sorted(Path(shard_dir).iterdir())
+                if (path / SCAN_STATE_FILE).exists()
+            ]
+        if not serie_dirs:
+            print(f"Error! no scanned serie found in {shard_dir}")
+            exit(1)
+        for serie_dir, serie_output_dir in serie_dirs:
+            shard_state = load_scan_state(serie_dir)
+            state = states.setdefault(serie_output_dir, {**shard_state, "addons": {}})
+            if state.get("start_commit") != shard_state.get("start_commit"):
+                print(
+                    f"Error! {serie_dir} doesn't start from the same commit"
+                    " as the other shards"
+                )
+                exit(1)
+            state["addons"].update(shard_state["addons"])
+            if serie_dir == serie_output_dir:
+                continue  # merging into this shard
+            for path in Path(serie_dir).iterdir():
+                if path.is_dir():
+                    shutil.copytree(
+                        path, f"{serie_output_dir}/{path.name}", dirs_exist_ok=True
+                    )
+        shard_index = f"{shard_dir}/{INDEX_FILE}"
+        if os.path.exists(shard_index) and os.path.abspath(index.path) != shard_index:
+            index.merge(shard_index)
+    index.close()
+
+    for serie_output_dir, state in states.items():
+        save_scan_state(serie_output_dir, state)
+        target_serie = state.get("target_serie") or int(
+            float(os.path.basename(serie_output_dir))
+        )
+        create_serie_readme(target_serie, serie_output_dir, state["addons"])
+        print(f"Merged {len(state['addons'])} addons into {serie_output_dir}")
+
 
+class DefaultScanGroup(typer.core.TyperGroup):
+    """
+    Run the scan command when no other command is given so
+    odoo-module-diff <repo_path> <target_serie> keeps working.
+    """
 
-@app.command()
+    def parse_args(self, ctx, args):
+        if args and args[0] not in self.commands and args[0] != "--help":
+            args = ["scan", *args]
+        return super().parse_args(ctx, args)
+
+
+app = typer.Typer(cls=DefaultScanGroup)
+
+
+@app.command("scan")
 def main(
     repo_path: str,
-    target_serie: float,
+    target_serie: float = typer.Argument(0),
     addon: str = "",
     output_dir: str = "module_diff_analysis",
     wrap_serie_dir: bool = True,
     dump_dependencies: bool = False,
     keep_noise: bool = False,
     commit: str = "",
+    jobs: int = 1,
+    cache_dir: str = "",
+    cache_size: int = DEFAULT_CACHE_SIZE,
+    incremental: bool = False,
+    profile: str = "",
+    series: str = "",
+    index: str = "",
+    blob_cache_size: int = DEFAULT_BLOB_CACHE_SIZE,
+    engine: str = "lines",
+    net_first: bool = False,
+    prefilter: bool = False,
+    dedup: bool = False,
+    shard: str = "",
 ):
+    if engine not in ENGINES:
+        print(f"Error! unknown engine {engine}, use one of {', '.join(ENGINES)}")
+        exit(1)
+    if prefilter and engine != "lines":
+        # only the lines engine scores can be predicted from the diff lines
+        print("WARNING! --prefilter only applies to the lines engine, ignored.")
+        prefilter = False
+    if dedup and commit:
+        print("WARNING! --dedup doesn't apply to a single --commit, ignored.")
+        dedup = False
+    shard_spec = parse_shard(shard) if shard else None
+    index = index or f"{output_dir}/{INDEX_FILE}"
+    profiler = enable_profiling() if profile else None
+    if series:  # a batch of consecutive series like 13-18
+        if commit or incremental:
+            print("Error! --series can't be combined with --commit or --incremental")
+            exit(1)
+        first, _sep, last = series.partition("-")
+        with stage("scan"):
+            scan_series(
+                repo_path=repo_path,
+                target_series=list(
+                    range(int(float(first)), int(float(last or first)) + 1)
+                ),
+                output_dir=output_dir,
+                addon=addon,
+                dump_dependencies=dump_dependencies,
+                keep_noise=keep_noise,
+                jobs=jobs,
+                cache_dir=cache_dir,
+                cache_size=cache_size,
+                index_path=index,
+                blob_cache_size=blob_cache_size,
+                engine=engine,
+                net_first=net_first,
+                prefilter=prefilter,
+                dedup=dedup,
+                shard=shard_spec,
+            )
+        if profiler is not None:
+            profiler.report(profile)
+        return
+
     target_serie = int(target_serie)  # (float this allows .0)
+    if not target_serie:
+        print("Error! a target serie or --series is required")
+        exit(1)
+    if wrap_serie_dir and str(target_serie) not in output_dir:
+        output_dir += f"/{target_serie}.0"
+    with stage("scan"):
+        scan(
+            repo_path=repo_path,
+            target_serie=target_serie,
+            addon=addon,
+            output_dir=output_dir,
+            dump_dependencies=dump_dependencies,
+            keep_noise=keep_noise,
+            commit=commit,
+            jobs=jobs,
+            cache_dir=cache_dir,
+            cache_size=cache_size,
+            incremental=incremental,
+            index_path=index,
+            blob_cache_size=blob_cache_size,
+            engine=engine,
+            net_first=net_first,
+            prefilter=prefilter,
+            dedup=dedup,
+            shard=shard_spec,
+        )
+    if profiler is not None:
+        profiler.report(profile)
+
+
+@app.command("scan-repos")
+def scan_repos_command(
+    target_serie: float,
+    repos: List[str],
+    output_dir: str = "module_diff_analysis",
+    wrap_serie_dir: bool = True,
+    dump_dependencies: bool = False,
+    keep_noise: bool = False,
+    jobs: int = 1,
+    cache_dir: str = "",
+    cache_size: int = DEFAULT_CACHE_SIZE,
+    profile: str = "",
+    index: str = "",
+    blob_cache_size: int = DEFAULT_BLOB_CACHE_SIZE,
+    engine: str = "lines",
+    prefilter: bool = False,
+):
+    """
+    Scan a serie in several repos (like odoo, enterprise and OCA ones) with a
+    single pool of jobs. Repos are given as prefix=path:addons_root where the
+    prefix (the repo dir name) and the addons root (the Odoo layout) are
+    optional, use . as addons root for the repos with their addons at the top.
+    """
+    if engine not in ENGINES:
+        print(f"Error! unknown engine {engine}, use one of {', '.join(ENGINES)}")
+        exit(1)
+    if prefilter and engine != "lines":
+        print("WARNING! --prefilter only applies to the lines engine, ignored.")
+        prefilter = False
+    repo_specs = [parse_repo_spec(spec) for spec in repos]
+    prefixes = [prefix for prefix, _path, _root in repo_specs]
+    if len(set(prefixes)) < len(prefixes):
+        print(f"Error! the repo prefixes {', '.join(prefixes)} should be unique")
+        exit(1)
+    target_serie = int(target_serie)
+    index = index or f"{output_dir}/{INDEX_FILE}"
     if wrap_serie_dir and str(target_serie) not in output_dir:
         output_dir += f"/{target_serie}.0"
-    scan(
-        repo_path=repo_path,
-        target_serie=target_serie,
-        addon=addon,
-        output_dir=output_dir,
-        dump_dependencies=dump_dependencies,
-        keep_noise=keep_noise,
-        commit=commit,
+    profiler = enable_profiling() if profile else None
+    with stage("scan"):
+        scan_repos(
+            repo_specs,
+            target_serie,
+            output_dir,
+            dump_dependencies=dump_dependencies,
+            keep_noise=keep_noise,
+            jobs=jobs,
+            cache_dir=cache_dir,
+            cache_size=cache_size,
+            index_path=index,
+            blob_cache_size=blob_cache_size,
+            engine=engine,
+            prefilter=prefilter,
+        )
+    if profiler is not None:
+        profiler.report(profile)
+
+
+@app.command()
+def reclassify(
+    index: str = f"module_diff_analysis/{INDEX_FILE}",
+    serie: str = "",
+    addon: str = "",
+    change_threshold: int = LINE_CHANGE_THRESHOLD,
+    feat_change_threshold: int = LINE_CHANGE_FEAT_THRESHOLD,
+    feat_message_threshold: int = LINE_MESSAGE_FEAT_THRESHOLD,
+    blacklist: Optional[List[str]] = typer.Option(None),
+):
+    """
+    Classify again the commits recorded by previous scans with other
+    thresholds (and blacklists) and show the commits that would flip
+    between __noise, c and feat, without reading git at all.
+    """
+    start = time.perf_counter()
+    result_index = ResultIndex(index)
+    rows = result_index.features(serie, addon)
+    result_index.close()
+    blacklists = BLACKLISTS if blacklist is None else [b for b in blacklist if b]
+
+    flips = defaultdict(list)
+    for row in rows:
+        is_noise, is_big_feature = classify_commit(
+            row["message"],
+            row["matches_rem"],
+            row["matches_add"],
+            row["matches_feat"],
+            row["total_changes"],
+            change_threshold,
+            feat_change_threshold,
+            feat_message_threshold,
+            blacklists,
+        )
+        kind = commit_kind(is_noise, is_big_feature)
+        if kind != row["kind"]:
+            flips[(row["kind"], kind)].append(row)
+    elapsed = time.perf_counter() - start
+
+    for (old_kind, new_kind), flipped in sorted(flips.items()):
+        print(f"\n{old_kind} -> {new_kind}: {len(flipped)} commits")
+        for row in flipped:
+            summary = row["message"].splitlines()[0]
+            print(f"  {row['serie']} {row['addon']} {row['sha'][:12]} {summary}")
+    print(
+        f"\n{len(rows)} commits reclassified in {elapsed:.3f}s, "
+        f"{sum(len(flipped) for flipped in flips.values())} flipped."
     )
 
 
+@app.command()
+def merge(
+    shard_dirs: List[str],
+    output_dir: str = "module_diff_analysis",
+    index: str = "",
+):
+    """
+    Merge the output dirs of the shards of a scan (see --shard) into a single
+    output dir with the same patches, README and index as an unsharded scan.
+    """
+    merge_shards(shard_dirs, output_dir, index)
+
+
+@app.command()
+def prepare(repo_path: str, sample_path: str = BASE_MODELS_PATH, rev: str = "HEAD"):
+    """
+    Check the clone and write its commit-graph with changed-path Bloom
+    filters and its multi-pack index so the path limited history queries
+    of the scans are faster. A sample walk is timed before and after.
+    """
+    prepare_repo(git.Repo(repo_path), sample_path, rev)
+
+
 if __name__ == "__main__":
     app()
@@ -0,0 +1,136 @@
+import os
+import time
+from typing import Dict, List, Tuple
+
+import git
+
+# commit-graph chunks holding the changed-path Bloom filters
+BLOOM_CHUNK_IDS = (b"BIDX", b"BDAT")
+BENCHMARK_RUNS = 2
+
+
+def objects_dir(repo: git.Repo) -> str:
+    return os.path.join(repo.common_dir, "objects")
+
+
+def commit_graph_files(repo: git.Repo) -> List[str]:
+    """
+    Paths of the commit-graph file and of the split commit-graph layers.
+    """
+    info_dir = os.path.join(objects_dir(repo), "info")
+    files = []
+    single = os.path.join(info_dir, "commit-graph")
+    if os.path.exists(single):
+        files.append(single)
+    try:
+        with open(os.path.join(info_dir, "commit-graphs", "commit-graph-chain")) as f:
+            for line in f:
+                if line.strip():
+                    files.append(
+                        os.path.join(
+                            info_dir, "commit-graphs", f"graph-{line.strip()}.graph"
+                        )
+                    )
+    except OSError:
+        pass
+    return files
+
+
+def has_changed_paths(path: str) -> bool:
+    """
+    Tell from the chunk table of a commit-graph file if it holds
+    the changed-path Bloom filters.
+    """
+    try:
+        with open(path, "rb") as f:
+            header = f.read(8)
+            if len(header) < 8 or header[:4] != b"CGPH":
+                return False
+            num_chunks = header[6]
+            table = f.read(12 * num_chunks)
+    except OSError:
+        return False
+    chunk_ids = {table[i : i + 4] for i in range(0, len(table), 12)}
+    return all(chunk_id in chunk_ids for chunk_id in BLOOM_CHUNK_IDS)
+
+
+def preparation_status(repo: git.Repo) -> Dict[str, bool]:
+    files = commit_graph_files(repo)
+    return {
+        "commit-graph": bool(files),
+        "changed-path Bloom filters": bool(files)
+        and all(has_changed_paths(path) for path in files),
+        "multi-pack index": os.path.exists(
+            os.path.join(objects_dir(repo), "pack", "multi-pack-index")
+        ),
+    }
+
+
+def warn_unprepared(repo: git.Repo):
+    """
+    Warn before scanning a repo without the commit-graph Bloom filters
+    and multi-pack index the path limited history queries benefit from.
+    """
+    missing = [name for name, ok in preparation_status(repo).items() if not ok]
+    if missing:
+        print(
+            f"WARNING! the repo has no {', '.join(missing)}, path limited history"
+            " queries will be slow. Run odoo-module-diff prepare on it first."
+        )
+
+
+def time_walk(repo: git.Repo, rev: str, path: str) -> Tuple[int, float]:
+    """
+    Time a path limited walk of the rev history like the scans do
+    (best of a few runs so a cold cache doesn't count).
+    Return (commit count, seconds).
+    """
+    best = None
+    for _run in range(BENCHMARK_RUNS):
+        start = time.perf_counter()
+        count = int(repo.git.rev_list("--count", rev, "--", path))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return count, best
+
+
+def check_clone(repo: git.Repo):
+    """
+    The scans need the full history and the blobs available locally.
+    """
+    if os.path.exists(os.path.join(repo.common_dir, "shallow")):
+        print(
+            "Error! the repo is a shallow clone, "
+            "fetch its full history with git fetch --unshallow first."
+        )
+        exit(1)
+    if repo.git.config("--get", "extensions.partialClone", with_exceptions=False):
+        print(
+            "WARNING! the repo is a partial clone, "
+            "the missing blobs will be fetched one by one while scanning."
+        )
+
+
+def prepare_repo(repo: git.Repo, sample_path: str, rev: str = "HEAD"):
+    """
+    Write (or refresh) the commit-graph with the changed-path Bloom filters
+    and the multi-pack index of the repo, timing a sample path limited
+    walk before and after.
+    """
+    check_clone(repo)
+    for name, ok in preparation_status(repo).items():
+        print(f"{name}: {'yes' if ok else 'no'}")
+
+    count, before = time_walk(repo, rev, sample_path)
+    print(f"Walking the {count} commits of {rev} touching {sample_path}: {before:.2f}s")
+
+    print("Writing the commit-graph with changed-path Bloom filters ...")
+    repo.git.commit_graph("write", "--reachable", "--changed-paths")
+    print("Writing the multi-pack index ...")
+    repo.git.multi_pack_index("write")
+
+    count, after = time_walk(repo, rev, sample_path)
+    print(
+        f"Walking the {count} commits of {rev} touching {sample_path}: {after:.2f}s"
+        f" ({before / max(after, 1e-6):.1f}x faster)"
+    )
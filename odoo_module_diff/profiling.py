@@ -0,0 +1,140 @@
+import json
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Optional
+
+import git
+
+NULL_CONTEXT = nullcontext()
+
+_profiler = None
+
+
+class Profiler:
+    """
+    Collect the wall time, call count, git process spawns and diff bytes
+    of the scan stages, per stage, per addon and per commit.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.addons: Dict[str, Dict[str, Dict[str, float]]] = {}
+        self.commits = []  # [elapsed, addon, sha, bytes]
+        self.spawns = 0
+        self.addon = ""
+
+    @staticmethod
+    def _add(table: Dict, key: str, elapsed: float, spawns: int, nbytes: int):
+        row = table.setdefault(key, {"time": 0.0, "calls": 0, "spawns": 0, "bytes": 0})
+        row["time"] += elapsed
+        row["calls"] += 1
+        row["spawns"] += spawns
+        row["bytes"] += nbytes
+
+    @contextmanager
+    def stage(self, name: str, commit: str = ""):
+        metrics = {"bytes": 0}
+        spawns = self.spawns
+        start = time.perf_counter()
+        try:
+            yield metrics
+        finally:
+            elapsed = time.perf_counter() - start
+            spawns = self.spawns - spawns
+            self._add(self.stages, name, elapsed, spawns, metrics["bytes"])
+            if self.addon:
+                addon_stages = self.addons.setdefault(self.addon, {})
+                self._add(addon_stages, name, elapsed, spawns, metrics["bytes"])
+            if commit:
+                self.commits.append([elapsed, self.addon, commit, metrics["bytes"]])
+
+    def data(self) -> Dict:
+        return {"stages": self.stages, "addons": self.addons, "commits": self.commits}
+
+    @staticmethod
+    def _merge(table: Dict, rows: Dict):
+        for key, row in rows.items():
+            total = table.setdefault(
+                key, {"time": 0.0, "calls": 0, "spawns": 0, "bytes": 0}
+            )
+            for metric, value in row.items():
+                total[metric] += value
+
+    def merge(self, data: Dict):
+        """
+        Merge the data collected by a worker process.
+        """
+        self._merge(self.stages, data["stages"])
+        for addon, addon_stages in data["addons"].items():
+            self._merge(self.addons.setdefault(addon, {}), addon_stages)
+        self.commits += data["commits"]
+
+    def report(self, path: str, top: int = 10):
+        """
+        Write the JSON report and print the stages and the slowest
+        addons and commits.
+        """
+        addons = {
+            addon: addon_stages["scan_addon_commits"]
+            for addon, addon_stages in self.addons.items()
+            if "scan_addon_commits" in addon_stages
+        }
+        slowest_addons = sorted(addons.items(), key=lambda item: -item[1]["time"])
+        slowest_commits = sorted(self.commits, reverse=True)[:top]
+        report = self.data()
+        report["slowest_addons"] = [addon for addon, _row in slowest_addons[:top]]
+        report["slowest_commits"] = slowest_commits
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+        print("\n***** profile ".ljust(80, "*"))
+        print(f"{'stage':<24}{'time':>10}{'calls':>10}{'spawns':>10}{'diff bytes':>14}")
+        for name, row in sorted(self.stages.items(), key=lambda item: -item[1]["time"]):
+            print(
+                f"{name:<24}{row['time']:>10.2f}{row['calls']:>10}"
+                f"{row['spawns']:>10}{row['bytes']:>14}"
+            )
+        print("\nslowest addons:")
+        for addon, row in slowest_addons[:top]:
+            print(f"  {row['time']:8.2f}s {addon} ({row['spawns']} git spawns)")
+        print("\nslowest commits:")
+        for elapsed, addon, sha, nbytes in slowest_commits:
+            print(f"  {elapsed:8.2f}s {addon} {sha} ({nbytes} diff bytes)")
+        print(f"\nProfile report written to {path}")
+
+
+def enable_profiling() -> Profiler:
+    """
+    Start profiling with a new profiler. Git process spawns are counted by
+    wrapping GitPython Git.execute which is left untouched when not profiling.
+    """
+    global _profiler
+    if _profiler is None:
+        execute = git.cmd.Git.execute
+
+        def counting_execute(self, *args, **kwargs):
+            _profiler.spawns += 1
+            return execute(self, *args, **kwargs)
+
+        git.cmd.Git.execute = counting_execute
+    _profiler = Profiler()
+    return _profiler
+
+
+def get_profiler() -> Optional[Profiler]:
+    return _profiler
+
+
+def stage(name: str, commit: str = ""):
+    """
+    Context manager timing a stage when profiling, else a shared no-op.
+    It yields a metrics dict where the diff "bytes" can be set, or None.
+    """
+    if _profiler is None:
+        return NULL_CONTEXT
+    return _profiler.stage(name, commit)
+
+
+def set_profiled_addon(addon: str):
+    if _profiler is not None:
+        _profiler.addon = addon
@@ -0,0 +1,192 @@
+import ast
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set
+
+from odoo_module_diff.blobs import BlobCache
+
+NULL_SHA = "0" * 40
+DEFAULT_SCHEMA_CACHE_ENTRIES = 4096
+EMPTY_MODEL = {"abstract": False, "inherit": [], "inherits": {}, "fields": {}}
+
+
+def dotted_name(node: ast.AST) -> str:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return f"{dotted_name(node.value)}.{node.attr}"
+    return ""
+
+
+def literal(node: ast.AST):
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError, RecursionError):
+        return None
+
+
+def strings(node: ast.AST) -> List[str]:
+    """
+    The strings of a str, list or tuple literal like an _inherit value.
+    """
+    value = literal(node)
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, (list, tuple)):
+        return [item for item in value if isinstance(item, str)]
+    return []
+
+
+def extract_schema(
+    source: bytes, field_attrs: Iterable[str]
+) -> Optional[Dict[str, Dict]]:
+    """
+    Extract the schema of the Odoo models declared in a python source:
+    {model: {"abstract": bool, "inherit": [model], "inherits": {model: field},
+    "fields": {name: [type, {attr: value}]}}} keeping only the field_attrs.
+    Transient models are ignored. Return None if the source can't be parsed
+    (like the python 2 sources of Odoo <= 10).
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+    field_attrs = set(field_attrs)
+    schema: Dict[str, Dict] = {}
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.ClassDef):
+            continue
+        bases = [dotted_name(base) for base in node.bases]
+        if any(base.endswith("TransientModel") for base in bases):
+            continue
+        name = None
+        inherit: List[str] = []
+        inherits: Dict[str, str] = {}
+        fields: Dict[str, List] = {}
+        for statement in node.body:
+            if not isinstance(statement, ast.Assign) or len(statement.targets) != 1:
+                continue
+            target = statement.targets[0]
+            if not isinstance(target, ast.Name):
+                continue
+            value = statement.value
+            if target.id == "_name":
+                name = literal(value)
+            elif target.id == "_inherit":
+                inherit = strings(value)
+            elif target.id == "_inherits":
+                inherits_value = literal(value)
+                if isinstance(inherits_value, dict):
+                    inherits = inherits_value
+            elif (
+                isinstance(value, ast.Call)
+                and isinstance(value.func, ast.Attribute)
+                and dotted_name(value.func.value) == "fields"
+            ):
+                attrs = {}
+                for keyword in value.keywords:
+                    if keyword.arg in field_attrs:
+                        if keyword.arg == "compute":
+                            # we don't want to track the exact compute method
+                            attrs[keyword.arg] = "some_method"
+                        else:
+                            attrs[keyword.arg] = repr(literal(keyword.value))
+                fields[target.id] = [value.func.attr, attrs]
+        model = name if isinstance(name, str) else (inherit and inherit[0])
+        if not model:
+            continue
+        model_schema = schema.setdefault(
+            model, {"abstract": False, "inherit": [], "inherits": {}, "fields": {}}
+        )
+        model_schema["abstract"] |= any(
+            base.endswith("AbstractModel") for base in bases
+        )
+        model_schema["inherit"] += [
+            i for i in inherit if i not in model_schema["inherit"]
+        ]
+        model_schema["inherits"].update(inherits)
+        model_schema["fields"].update(fields)
+    return schema
+
+
+def merge_schemas(schemas: Iterable[Dict[str, Dict]]) -> Dict[str, Dict]:
+    """
+    Merge the schemas of several files, a model may be spread among them.
+    """
+    merged: Dict[str, Dict] = {}
+    for schema in schemas:
+        for model, model_schema in schema.items():
+            merged_model = merged.setdefault(
+                model, {"abstract": False, "inherit": [], "inherits": {}, "fields": {}}
+            )
+            merged_model["abstract"] |= model_schema["abstract"]
+            merged_model["inherit"] += [
+                i for i in model_schema["inherit"] if i not in merged_model["inherit"]
+            ]
+            merged_model["inherits"].update(model_schema["inherits"])
+            merged_model["fields"].update(model_schema["fields"])
+    return merged
+
+
+def schema_change_names(old: Dict[str, Dict], new: Dict[str, Dict]) -> Set[str]:
+    """
+    Names of the fields (or _inherit and _inherits) that differ
+    between two schemas in any of their models.
+    """
+    names = set()
+    for model in old.keys() | new.keys():
+        old_model = old.get(model, EMPTY_MODEL)
+        new_model = new.get(model, EMPTY_MODEL)
+        if set(old_model["inherit"]) != set(new_model["inherit"]):
+            names.add("_inherit")
+        if old_model["inherits"] != new_model["inherits"]:
+            names.add("_inherits")
+        for name in old_model["fields"].keys() | new_model["fields"].keys():
+            if old_model["fields"].get(name) != new_model["fields"].get(name):
+                names.add(name)
+    return names
+
+
+class SchemaCache:
+    """
+    In memory LRU cache of the model schemas keyed by blob sha, so the
+    source of a models file is parsed only once whatever the number of
+    commits, parents or series it is compared in.
+    """
+
+    def __init__(
+        self,
+        blobs: BlobCache,
+        field_attrs: Iterable[str],
+        max_entries: int = DEFAULT_SCHEMA_CACHE_ENTRIES,
+    ):
+        self.blobs = blobs
+        self.field_attrs = tuple(field_attrs)
+        self.max_entries = max_entries
+        self.schemas: OrderedDict[str, Optional[Dict]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def schema(self, sha: Optional[str]) -> Optional[Dict[str, Dict]]:
+        """
+        The schema of a blob, None if it can't be parsed.
+        """
+        if not sha or sha == NULL_SHA:
+            return {}
+        if sha in self.schemas:
+            self.hits += 1
+            self.schemas.move_to_end(sha)
+            return self.schemas[sha]
+        self.misses += 1
+        schema = extract_schema(self.blobs.read(sha), self.field_attrs)
+        self.schemas[sha] = schema
+        if len(self.schemas) > self.max_entries:
+            self.schemas.popitem(last=False)
+        return schema
+
+    def report(self):
+        parses = self.hits + self.misses
+        if parses:
+            print(
+                f"Schema cache: {self.hits} hits, {self.misses} misses"
+                f" ({100 * self.hits / parses:.1f}% hit rate)"
+            )
@@ -0,0 +1,189 @@
+import itertools
+import os
+from typing import Dict
+
+import git
+import pytest
+
+from odoo_module_diff.history import (
+    addon_models_path,
+    bucket_commits_by_addon,
+    bucket_commits_by_range,
+)
+
+ADDONS = ["base", "a", "b", "c"]
+# distinct commit dates: git orders the commits of the same date by its walk
+DATES = itertools.count(1600000000, 60)
+
+
+def _dated() -> Dict[str, str]:
+    date = f"{next(DATES)} +0000"
+    return {"GIT_AUTHOR_DATE": date, "GIT_COMMITTER_DATE": date}
+
+
+def _commit(repo: git.Repo, message: str, files: Dict[str, str]) -> str:
+    for path, content in files.items():
+        full_path = os.path.join(repo.working_dir, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "w") as f:
+            f.write(content)
+        repo.git.add(path)
+    repo.git.commit("-q", "-m", message, env=_dated())
+    return repo.head.commit.hexsha
+
+
+def _merge(repo: git.Repo, *branches: str, strategy: str = "") -> str:
+    options = ["-s", strategy] if strategy else []
+    repo.git.merge("-q", "--no-ff", "--no-edit", *options, *branches, env=_dated())
+    return repo.head.commit.hexsha
+
+
+def _fields(*names: str) -> str:
+    return "class A(models.Model):\n" + "".join(
+        f"    {name} = fields.Char()\n" for name in names
+    )
+
+
+@pytest.fixture(scope="module")
+def merge_repo(tmp_path_factory):
+    """
+    A history where the merges keep one side for some addons (so a path
+    limited git log drops the other side) and differ from all their
+    parents for others, with an octopus merge.
+    """
+    repo = git.Repo.init(tmp_path_factory.mktemp("repo"))
+    repo.git.symbolic_ref("HEAD", "refs/heads/main")
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "Dev Eloper")
+        config.set_value("user", "email", "dev@example.com")
+    before = _commit(repo, "before", {"addons/b/models/b.py": _fields("b0")})
+    start = _commit(
+        repo,
+        "init",
+        {
+            "odoo/addons/base/models/res.py": _fields("x"),
+            "addons/a/models/a.py": _fields("a1", "a2", "a3", "a4"),
+            "addons/b/models/b.py": _fields("b1"),
+            "addons/c/models/c.py": _fields("c1"),
+        },
+    )
+
+    # b only changes on the side branch: the merge takes its side for b
+    repo.git.checkout("-q", "-b", "side1")
+    _commit(repo, "[IMP] b", {"addons/b/models/b.py": _fields("b1", "b2")})
+    repo.git.checkout("-q", "main")
+    _commit(
+        repo, "[IMP] a", {"addons/a/models/a.py": _fields("a0", "a1", "a2", "a3", "a4")}
+    )
+    _commit(repo, "[IMP] a views", {"addons/a/views/a.xml": "<odoo/>\n"})
+    middle = _merge(repo, "side1")
+
+    # a merge of the start with an older commit, the same as the start: the
+    # ranges starting later show it (it differs from the older commit for b)
+    side0 = repo.git.commit_tree(
+        repo.commit(start).tree.hexsha,
+        "-p",
+        start,
+        "-p",
+        before,
+        "-m",
+        "Merge before",
+        env=_dated(),
+    )
+    repo.git.branch("side0", side0)
+    repo.git.checkout("-q", "side0")
+    _commit(repo, "[ADD] b z", {"addons/b/models/z.py": _fields("z1")})
+    repo.git.checkout("-q", "main")
+    _merge(repo, "side0")
+
+    # merged with -s ours: the side branch is dropped for every addon
+    repo.git.checkout("-q", "-b", "side2")
+    _commit(
+        repo,
+        "[REF] a and b",
+        {
+            "addons/a/models/a.py": _fields("a1"),
+            "addons/b/models/b.py": _fields("b3"),
+        },
+    )
+    repo.git.checkout("-q", "main")
+    _merge(repo, "side2", strategy="ours")
+
+    # a changes on both sides: the merge differs from both its parents
+    repo.git.checkout("-q", "-b", "side3")
+    _commit(
+        repo,
+        "[IMP] a side",
+        {"addons/a/models/a.py": _fields("a0", "a1", "a2", "a3", "a4", "a5")},
+    )
+    repo.git.checkout("-q", "main")
+    _commit(
+        repo,
+        "[IMP] a and base",
+        {
+            "addons/a/models/a.py": _fields("a", "a1", "a2", "a3", "a4"),
+            "odoo/addons/base/models/res.py": _fields("x", "y"),
+        },
+    )
+    _merge(repo, "side3")
+
+    # an octopus merge changing c on both of its side branches
+    repo.git.checkout("-q", "-b", "side4")
+    _commit(repo, "[ADD] c d", {"addons/c/models/d.py": _fields("d1")})
+    repo.git.checkout("-q", "main")
+    repo.git.checkout("-q", "-b", "side5")
+    _commit(repo, "[ADD] c e", {"addons/c/models/e.py": _fields("e1")})
+    repo.git.checkout("-q", "main")
+    _commit(repo, "[IMP] b main", {"addons/b/models/b.py": _fields("b1", "b2", "b9")})
+    end = _merge(repo, "side4", "side5")
+    return repo, start, middle, end
+
+
+def _path_limited_log(repo: git.Repo, start: str, end: str, addon: str):
+    """
+    The commits of a path limited git log of the addon models with the lines
+    they change there against their first parent.
+    """
+    module_path = addon_models_path(addon)
+    commits = {}
+    for commit in repo.iter_commits(f"{start}..{end}", paths=module_path):
+        commits[commit.hexsha] = sum(
+            stats["lines"]
+            for path, stats in commit.stats.files.items()
+            if str(path).startswith(module_path)
+        )
+    return list(commits.items())
+
+
+def test_bucket_commits_by_addon(merge_repo):
+    repo, start, _middle, end = merge_repo
+    buckets = bucket_commits_by_addon(
+        repo, repo.commit(start), repo.commit(end), ADDONS
+    )
+    for addon in ADDONS:
+        assert list(buckets.get(addon, {}).items()) == _path_limited_log(
+            repo, start, end, addon
+        )
+    # the side branch merged with -s ours is dropped
+    summaries = {repo.commit(sha).summary for sha in buckets["a"]}
+    assert "[REF] a and b" not in summaries
+    assert "[IMP] b" in {repo.commit(sha).summary for sha in buckets["b"]}
+
+
+def test_bucket_commits_by_range(merge_repo):
+    repo, start, middle, end = merge_repo
+    ranges = {"first": (start, middle), "second": (middle, end), "all": (start, end)}
+    buckets = bucket_commits_by_range(repo, ranges, ADDONS)
+    for key, (range_start, range_end) in ranges.items():
+        # the walk of the union of the ranges misses none of their commits
+        assert buckets[key] == bucket_commits_by_addon(
+            repo, repo.commit(range_start), repo.commit(range_end), ADDONS
+        )
+    # git log of the second range also hides "Merge before": the parents of
+    # this merge are not marked uninteresting yet when git simplifies it
+    for key in ("first", "all"):
+        range_start, range_end = ranges[key]
+        for addon in ADDONS:
+            assert list(buckets[key].get(addon, {}).items()) == _path_limited_log(
+                repo, range_start, range_end, addon
+            )
@@ -0,0 +1,114 @@
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from odoo_module_diff import main
+from odoo_module_diff.history import FilePatch
+from odoo_module_diff.main import (
+    SCHEMA_FIELD_ATTRS,
+    diff_schemas,
+    heuristics_version,
+    scan_commit,
+)
+from odoo_module_diff.schema import extract_schema
+
+# diffs of synthetic Odoo-like commits and random diffs mixing the tricky
+# lines (multi-line fields, type swaps, _inherit lists, TransienModel...)
+# with the scores the original line scanner gave them.
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "data", "scanner_corpus.json")
+
+with open(CORPUS_PATH) as f:
+    CORPUS = json.load(f)
+
+
+@pytest.mark.parametrize("case", CORPUS, ids=[case["name"] for case in CORPUS])
+def test_scan_commit_golden_corpus(case):
+    parent_shas = [f"parent{i}" for i in range(len(case["parents"]))]
+    commit = SimpleNamespace(
+        parents=[SimpleNamespace(hexsha=sha) for sha in parent_shas]
+    )
+    patches = {
+        sha: [
+            FilePatch(a_path, b_path, diff.encode())
+            for a_path, b_path, diff in parent_patches
+        ]
+        for sha, parent_patches in zip(parent_shas, case["parents"])
+    }
+    result = scan_commit(case["path"], commit, patches)
+    assert list(result) == case["expected"]
+
+
+def _other_classify_line(line: str) -> int:
+    return 0
+
+
+@pytest.mark.parametrize(
+    "name, value",
+    [
+        ("NON_TRIVIAL_FIELD_ATTRS", ("required=",)),
+        ("LINE_MARKERS", ()),
+        ("FIELD_TYPE_SWAPS", ()),
+        ("FIELD_TYPE_FAMILIES", ()),
+        ("classify_line", _other_classify_line),
+        ("is_same_field", _other_classify_line),
+    ],
+)
+def test_heuristics_version_lines(monkeypatch, name, value):
+    version = heuristics_version("lines")
+    monkeypatch.setattr(main, name, value)
+    assert heuristics_version("lines") != version
+
+
+@pytest.mark.parametrize(
+    "name, value",
+    [
+        ("FIELD_TYPE_SWAPS", ()),
+        ("is_same_field", _other_classify_line),
+        ("merge_schemas", _other_classify_line),
+        ("schema_field_line", _other_classify_line),
+    ],
+)
+def test_heuristics_version_ast(monkeypatch, name, value):
+    version = heuristics_version("ast")
+    monkeypatch.setattr(main, name, value)
+    assert heuristics_version("ast") != version
+
+
+def _schema(source: str):
+    return extract_schema(source.encode(), SCHEMA_FIELD_ATTRS)
+
+
+@pytest.mark.parametrize(
+    "old_field, new_field, expected",
+    [
+        # a type swap alone is cancelled like the line scanners do
+        ("fields.Char(string='Name', store=True)", "fields.Text(store=True)", 0),
+        ("fields.Integer()", "fields.Float()", 0),
+        # but not when some non trivial attr changed too
+        ("fields.Char(store=True)", "fields.Text()", 0.4),
+        ("fields.Integer()", "fields.Float(store=True)", 0.4),
+    ],
+)
+def test_diff_schemas_type_swaps(old_field, new_field, expected):
+    model = "class A(models.Model):\n    _name = 'a'\n    name = {}\n"
+    patch = "\n".join(
+        ["@@ -1,3 +1,3 @@", " class A(models.Model):", "     _name = 'a'"]
+        + [f"-    name = {old_field}", f"+    name = {new_field}"]
+    )
+    commit = SimpleNamespace(parents=[SimpleNamespace(hexsha="parent")])
+    lines_result = scan_commit(
+        "a.py", commit, {"parent": [FilePatch("a.py", "a.py", patch.encode())]}
+    )
+    score_del, score_add, _score_feat, matches = diff_schemas(
+        _schema(model.format(old_field)), _schema(model.format(new_field))
+    )
+    assert score_del == lines_result[1] == expected
+    assert score_add == 0
+    assert bool(matches) == bool(expected)
+
+
+def test_extract_schema_unparsable():
+    assert _schema("class A(models.Model):\n    print 'python 2'\n") is None
+    assert _schema("") == {}